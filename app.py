@@ -1,18 +1,58 @@
-from fastapi import FastAPI, Request, Form, Depends, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
-from fastapi.templating import Jinja2Templates
+from fastapi import FastAPI, Request, Form, Depends, HTTPException, Body, File, UploadFile
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, Response, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
+from fastapi.middleware.gzip import GZipMiddleware
+from pydantic import BaseModel
+from sqlalchemy import func, or_, text, column, select, insert, update, case, union_all
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from datetime import date, datetime, time, timedelta
-
-from db import Base, engine, SessionLocal
-from models import Specialty, Staff, Client, Appointment
-
-Base.metadata.create_all(bind=engine)
+import asyncio
+import csv
+import hashlib
+import heapq
+import io
+import json
+import os
+import urllib.parse
+from collections import OrderedDict, namedtuple
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from itertools import accumulate, islice
+
+from db import SessionLocal, AsyncSessionLocal, engine, async_engine
+from models import Specialty, Staff, Client, Appointment, AppointmentArchive, AppMeta, ChangeLog
+from phones import _digits, normalize_ar_phone_to_wa
+import migrations
+import metrics
+import importer
+import reports
+import live
+import archive
+
+migrations.migrate()
+
+metrics.instrument_engine(engine)
+metrics.instrument_engine(async_engine.sync_engine)
+
+# logo / manifest: cache largo en el navegador (ETag / Last-Modified siguen
+# validando cuando vence)
+STATIC_MAX_AGE = 30 * 24 * 3600
+
+class CachedStaticFiles(StaticFiles):
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers.setdefault("Cache-Control", f"public, max-age={STATIC_MAX_AGE}")
+        return response
 
 app = FastAPI()
-templates = Jinja2Templates(directory="templates")
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# el SSE queda abierto minutos: no es latencia de un request
+app.add_middleware(metrics.MetricsMiddleware, skip_paths=("/metrics", "/turnos/live"))
+# brotli no está entre las dependencias: gzip alcanza para el HTML / JSON
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+templates = metrics.TimedTemplates(directory="templates")
+app.mount("/static", CachedStaticFiles(directory="static"), name="static")
 
 STUDIO_WA_NUMBER = "5491167253722"  # número del estudio
 
@@ -24,41 +64,78 @@ def get_db():
     finally:
         db.close()
 
-# ---------------- PHONE / WA ----------------
-def _digits(s: str) -> str:
-    return "".join(ch for ch in (s or "") if ch.isdigit())
+async def get_async_db():
+    # para rutas `async def`; los helpers sync se llaman con `await db.run_sync(...)`
+    async with AsyncSessionLocal() as db:
+        yield db
 
-def normalize_ar_phone_to_wa(phone_raw: str) -> str:
-    """
-    Entrada típica: 11xxxxxxxx (sin +54 9).
-    Salida WhatsApp: 54911xxxxxxxx
-    """
-    p = _digits(phone_raw)
+# ---------------- VERSIONES / DATOS DE REFERENCIA ----------------
+def get_version(db: Session, key: str) -> int:
+    return db.query(AppMeta.value).filter(AppMeta.key == key).scalar() or 0
 
-    if p.startswith("549") and len(p) >= 12:
-        return p
+def bump_version(db: Session, key: str):
+    """Incrementa el contador `key` dentro de la transacción actual."""
+    stmt = sqlite_insert(AppMeta).values(key=key, value=1)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[AppMeta.key],
+        set_={"value": AppMeta.value + 1},
+    ))
 
-    if p.startswith("54") and len(p) >= 11:
-        if p.startswith("549"):
-            return p
-        # 54 + 11xxxx -> 54911xxxx
-        if len(p) >= 12 and p[2:4] == "11":
-            return "549" + p[2:]
-        return p
+def begin_booking_write(db: Session):
+    """
+    Primera sentencia de una transacción que chequea solapamientos y después
+    guarda turnos: sube la versión "appointments" (ver nearest_open_date) y
+    con eso toma el lock de escritura de SQLite. Otra reserva en paralelo
+    espera (busy_timeout) hasta el commit, y su chequeo ya ve este turno.
+    """
+    bump_version(db, "appointments")
+
+def get_versions(db: Session, keys: list[str]) -> dict[str, int]:
+    rows = db.query(AppMeta.key, AppMeta.value).filter(AppMeta.key.in_(keys)).all()
+    found = dict(rows)
+    return {k: found.get(k, 0) for k in keys}
+
+# versión por (fecha, staff, salón): la suben los handlers que crean /
+# editan / cancelan turnos o marcan WA, y con ella /turnos responde 304
+# sin leer appointments
+def day_key(d: date, staff_id: int | None, salon: int | None) -> str:
+    return f"day:{d.isoformat()}:{staff_id or 0}:{salon or 1}"
+
+def bump_day_versions(db: Session, keys):
+    for key in sorted(set(keys)):
+        bump_version(db, key)
+
+# Staff y especialidades cambian muy poco: se cachean en memoria como tuplas
+# inmutables y se recargan cuando cambia la versión "refdata" en app_meta
+# (así cada worker de uvicorn se entera de los cambios hechos por otro)
+StaffRef = namedtuple("StaffRef", "id name")
+SpecialtyRef = namedtuple("SpecialtyRef", "id name color_hex")
+
+_refdata = {"version": None, "staff": (), "specialties": ()}
+
+def get_refdata(db: Session) -> tuple[tuple[StaffRef, ...], tuple[SpecialtyRef, ...]]:
+    version = get_version(db, "refdata")
+    if _refdata["version"] != version:
+        staff = db.query(Staff.id, Staff.name).order_by(Staff.name.asc()).all()
+        specialties = db.query(Specialty.id, Specialty.name, Specialty.color_hex).order_by(Specialty.name.asc()).all()
+        _refdata["staff"] = tuple(StaffRef(*r) for r in staff)
+        _refdata["specialties"] = tuple(SpecialtyRef(*r) for r in specialties)
+        _refdata["version"] = version
+    return _refdata["staff"], _refdata["specialties"]
 
-    if p.startswith("11") and len(p) >= 10:
-        return "549" + p
+# ---------------- PHONE / WA ----------------
+DIAS = ["Lunes","Martes","Miércoles","Jueves","Viernes","Sábado","Domingo"]
 
-    return p
+# el mismo cliente aparece en muchos turnos: se normaliza una vez por teléfono
+wa_phone = lru_cache(maxsize=4096)(normalize_ar_phone_to_wa)
 
-def make_wa_message(appt: Appointment) -> str:
-    dias = ["Lunes","Martes","Miércoles","Jueves","Viernes","Sábado","Domingo"]
-    dname = dias[appt.date.weekday()]
-    dnum = appt.date.day
-    hora = appt.start_time.strftime("%H:%M")
+def _wa_message(d: date, start_t: time, client_name: str | None, specialty_name: str | None) -> str:
+    dname = DIAS[d.weekday()]
+    dnum = d.day
+    hora = start_t.strftime("%H:%M")
 
-    cliente = (appt.client.name if appt.client and appt.client.name else "hola")
-    servicio = (appt.specialty.name if appt.specialty and appt.specialty.name else "un servicio")
+    cliente = (client_name or "hola")
+    servicio = (specialty_name or "un servicio")
 
     return (
         f"Hola cómo estás {cliente}?, recordá que tenés un turno agendado para realizarte {servicio} "
@@ -67,6 +144,17 @@ def make_wa_message(appt: Appointment) -> str:
         f"Angie’s Color"
     )
 
+def make_wa_message(appt: Appointment) -> str:
+    return _wa_message(
+        appt.date,
+        appt.start_time,
+        (appt.client.name if appt.client else None),
+        (appt.specialty.name if appt.specialty else None),
+    )
+
+def make_wa_url(phone_raw: str | None, msg: str) -> str:
+    return f"https://wa.me/{wa_phone(phone_raw or '')}?text={urllib.parse.quote(msg)}"
+
 
 # ---------------- SLOTS ----------------
 def build_slots(start_h=8, end_h=19, step_min=30):
@@ -78,48 +166,96 @@ def build_slots(start_h=8, end_h=19, step_min=30):
         t += timedelta(minutes=step_min)
     return slots
 
-SLOTS = build_slots()
+SLOT_STEP_MIN = 30
+SLOTS = build_slots(step_min=SLOT_STEP_MIN)
 
 def _minutes(t: time) -> int:
     return t.hour * 60 + t.minute
 
-def _overlap(a_start: int, a_end: int, b_start: int, b_end: int) -> bool:
-    # intervalos [start, end)
-    return a_start < b_end and b_start < a_end
+def _hhmm(m: int) -> str:
+    m %= 24 * 60
+    return f"{m // 60:02d}:{m % 60:02d}"
 
-def assert_no_overlap(
+@lru_cache(maxsize=8)
+def _slot_grid(slots: tuple[time, ...]) -> tuple[list[int], list[str]]:
+    """Grilla precalculada: minutos (para bisect) y etiquetas HH:MM."""
+    ordered = sorted(slots)
+    return [_minutes(t) for t in ordered], [t.strftime("%H:%M") for t in ordered]
+
+class DayIntervals:
+    """
+    Intervalos [start, end) de los turnos de un (día, staff, salón), como
+    tuplas (start_min, end_min, id) ordenadas por inicio.
+    `collides` responde en O(log n) con bisect sobre los inicios y el máximo
+    acumulado de los finales (así también detecta choques con solapamientos
+    viejos que ya estén en la base).
+    """
+
+    def __init__(self, items=()):
+        self.items = sorted(items)
+        self.starts = [s for s, _, _ in self.items]
+        self.max_end = list(accumulate((e for _, e, _ in self.items), max))
+
+    def collides(self, start: int, end: int) -> bool:
+        # turnos que empiezan antes de `end`: chocan si alguno termina después de `start`
+        i = bisect_left(self.starts, end)
+        return i > 0 and self.max_end[i - 1] > start
+
+    def add(self, start: int, end: int, appt_id: int = 0):
+        item = (start, end, appt_id)
+        i = bisect_right(self.items, item)
+        self.items.insert(i, item)
+        self.starts.insert(i, start)
+        # recalcula el máximo acumulado desde la posición insertada
+        running = self.max_end[i - 1] if i else end
+        tail = []
+        for _, e, _ in self.items[i:]:
+            running = max(running, e)
+            tail.append(running)
+        self.max_end[i:] = tail
+
+def load_day_intervals(
     db: Session,
     d: date,
-    start_t: time,
-    dur_min: int,
     staff_id: int | None,
     salon: int,
     exclude_appt_id: int | None = None,
-):
-    """Evita solapamientos en mismo día + mismo staff + mismo salón."""
-    a_start = _minutes(start_t)
-    a_end = a_start + int(dur_min)
-
-    q = db.query(Appointment).filter(
+) -> DayIntervals:
+    q = db.query(Appointment.id, Appointment.start_time, Appointment.duration_min).filter(
         Appointment.date == d,
         Appointment.status != "CANCELADO",
         Appointment.salon == salon,
     )
     if staff_id:
         q = q.filter(Appointment.staff_id == staff_id)
+    if exclude_appt_id:
+        q = q.filter(Appointment.id != exclude_appt_id)
 
-    appts = q.all()
+    items = []
+    for appt_id, start_t, dur in q:
+        b_start = _minutes(start_t)
+        items.append((b_start, b_start + int(dur or 0), appt_id))
+    return DayIntervals(items)
 
-    for ap in appts:
-        if exclude_appt_id and ap.id == exclude_appt_id:
-            continue
-        b_start = _minutes(ap.start_time)
-        b_end = b_start + int(ap.duration_min or 0)
-        if _overlap(a_start, a_end, b_start, b_end):
-            raise HTTPException(
-                status_code=400,
-                detail="Ese horario se superpone con otro turno (por duración)."
-            )
+def assert_no_overlap(
+    db: Session,
+    d: date,
+    start_t: time,
+    dur_min: int,
+    staff_id: int | None,
+    salon: int,
+    exclude_appt_id: int | None = None,
+):
+    """Evita solapamientos en mismo día + mismo staff + mismo salón."""
+    a_start = _minutes(start_t)
+    a_end = a_start + int(dur_min)
+
+    intervals = load_day_intervals(db, d, staff_id, salon, exclude_appt_id)
+    if intervals.collides(a_start, a_end):
+        raise HTTPException(
+            status_code=400,
+            detail="Ese horario se superpone con otro turno (por duración)."
+        )
 
 def build_slot_state(slots: list[time], appts: list[Appointment]) -> dict:
     """
@@ -128,9 +264,8 @@ def build_slot_state(slots: list[time], appts: list[Appointment]) -> dict:
     - APPT (solo en hora de inicio)
     - BLOCKED (slots intermedios ocupados por duración)
     """
-    state = {}
-    for t in slots:
-        state[t.strftime("%H:%M")] = {"kind": "FREE"}
+    minutes, labels = _slot_grid(tuple(slots))
+    state = {k: {"kind": "FREE"} for k in labels}
 
     # Orden por inicio
     appts = sorted(appts, key=lambda a: _minutes(a.start_time))
@@ -140,45 +275,273 @@ def build_slot_state(slots: list[time], appts: list[Appointment]) -> dict:
         end_min = start_min + int(a.duration_min or 0)
 
         # marca slot inicio
-        k = a.start_time.strftime("%H:%M")
-        state[k] = {"kind": "APPT", "appt": a}
-
-        # marca slots siguientes como BLOQUEADOS
-        for t in slots:
-            m = _minutes(t)
-            if m > start_min and m < end_min:
-                kk = t.strftime("%H:%M")
-                # no pisar si hay otro turno que empieza justo ahí (pero igual sería solapado)
-                if state.get(kk, {}).get("kind") == "FREE":
-                    state[kk] = {
-                        "kind": "BLOCKED",
-                        "owner_id": a.id,
-                        "owner_start": a.start_time.strftime("%H:%M"),
-                        "owner_end": (datetime.combine(date.today(), a.start_time) + timedelta(minutes=int(a.duration_min or 0))).time().strftime("%H:%M")
-                    }
+        start_label = _hhmm(start_min)
+        state[start_label] = {"kind": "APPT", "appt": a}
+
+        # slots con start_min < m < end_min: se ubican con bisect, sin recorrer toda la grilla
+        lo = bisect_right(minutes, start_min)
+        hi = bisect_left(minutes, end_min)
+        if lo >= hi:
+            continue
+
+        blocked = {
+            "kind": "BLOCKED",
+            "owner_id": a.id,
+            "owner_start": start_label,
+            "owner_end": _hhmm(end_min),
+        }
+        for kk in labels[lo:hi]:
+            # no pisar si hay otro turno que empieza justo ahí (pero igual sería solapado)
+            if state[kk]["kind"] == "FREE":
+                state[kk] = blocked
 
     return state
 
+def build_slot_states(appts, key, keys=(), slots: list[time] = SLOTS) -> dict:
+    """
+    Varios build_slot_state de una vez (ej. por staff o por día):
+    agrupa `appts` según `key(a)` y devuelve {clave: slot_state}.
+    Las claves de `keys` sin turnos salen con todos los slots libres.
+    """
+    groups = {k: [] for k in keys}
+    for a in appts:
+        groups.setdefault(key(a), []).append(a)
+    return {k: build_slot_state(slots, group) for k, group in groups.items()}
+
+# ---------------- MÉTRICAS ----------------
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    return PlainTextResponse(
+        metrics.registry.render_prometheus(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+# ---------------- EXPORTAR ----------------
+EXPORT_BATCH = 1000
+
+def _export_value(v):
+    if isinstance(v, (date, time)):
+        return v.isoformat()
+    return v
+
+def _stream_rows(stmts: list, columns: list[str], formato: str, key=None):
+    """
+    Genera el archivo por partes: usa su propia sesión (la del request ya
+    se cerró cuando se manda el cuerpo) y `yield_per` para no cargar todo
+    en memoria. Con varias sentencias (cada una ya ordenada por `key`) las
+    intercala con heapq.merge, sin ORDER BY sobre el conjunto.
+    """
+    db = SessionLocal()
+    try:
+        results = [db.execute(stmt.execution_options(yield_per=EXPORT_BATCH)) for stmt in stmts]
+        rows = heapq.merge(*results, key=key) if len(results) > 1 else results[0]
+        batches = iter(lambda: list(islice(rows, EXPORT_BATCH)), [])
+        if formato == "csv":
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(columns)
+            for batch in batches:
+                writer.writerows([[_export_value(v) for v in row] for row in batch])
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+            yield buf.getvalue()
+        else:
+            yield "["
+            first = True
+            for batch in batches:
+                chunk = ",".join(
+                    json.dumps({c: _export_value(v) for c, v in zip(columns, row)}, ensure_ascii=False)
+                    for row in batch
+                )
+                yield ("" if first else ",") + chunk
+                first = False
+            yield "]"
+    finally:
+        db.close()
+
+def _export_response(stmts: list, columns: list[str], formato: str, filename: str, key=None) -> StreamingResponse:
+    if formato not in ("csv", "json"):
+        raise HTTPException(status_code=400, detail="Formato inválido (csv o json)")
+    media_type = "text/csv; charset=utf-8" if formato == "csv" else "application/json"
+    return StreamingResponse(
+        _stream_rows(stmts, columns, formato, key),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{formato}"'},
+    )
+
+@app.get("/exportar/turnos")
+def exportar_turnos(formato: str = "csv", desde: str = "", hasta: str = "", estado: str = ""):
+    names = [
+        "id", "fecha", "hora", "duracion_min", "estado", "salon",
+        "cliente_id", "cliente", "telefono", "servicio", "staff",
+        "sena_pagada", "sena_monto", "wa_enviado", "notas",
+    ]
+    try:
+        d_from = datetime.strptime(desde, "%Y-%m-%d").date() if desde else None
+        d_to = datetime.strptime(hasta, "%Y-%m-%d").date() if hasta else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fecha inválida")
+
+    # turnos activos + archivados (archive.py), con los mismos filtros; cada
+    # parte sale ordenada por su índice de fecha y se intercalan al escribir
+    # (un ORDER BY sobre el UNION ordenaría todo el rango antes de la 1ra fila)
+    parts = []
+    for model in (Appointment, AppointmentArchive):
+        part = select(
+            model.id, model.date, model.start_time, model.duration_min,
+            model.status, model.salon,
+            model.client_id, Client.name, Client.phone,
+            Specialty.name, Staff.name,
+            model.deposit_paid, model.deposit_amount, model.wa_sent, model.notes,
+        ).join(Client, model.client_id == Client.id).outerjoin(
+            Specialty, model.specialty_id == Specialty.id
+        ).outerjoin(
+            Staff, model.staff_id == Staff.id
+        )
+        if d_from:
+            part = part.where(model.date >= d_from)
+        if d_to:
+            part = part.where(model.date <= d_to)
+        if estado:
+            part = part.where(model.status == estado.strip().upper())
+        parts.append(part.order_by(model.date, model.start_time, model.id))
+
+    suffix = "_".join(p for p in (desde, hasta) if p)
+    return _export_response(
+        parts, names, formato, "turnos" + (f"_{suffix}" if suffix else ""),
+        key=lambda r: (r[1], r[2], r[0]),
+    )
+
+@app.get("/exportar/clientes")
+def exportar_clientes(formato: str = "csv"):
+    cols = [Client.id, Client.name, Client.phone, Client.email, Client.notes, Client.last_visit]
+    names = ["id", "nombre", "telefono", "email", "notas", "ultima_visita"]
+    stmt = select(*cols).order_by(Client.id.asc())
+    return _export_response([stmt], names, formato, "clientes")
+
 # ---------------- HOME ----------------
 @app.get("/", response_class=HTMLResponse)
 def home():
     return RedirectResponse("/turnos", status_code=302)
 
 # ---------------- CLIENTES ----------------
-@app.get("/clientes", response_class=HTMLResponse)
-def clientes(request: Request, q: str = "", db: Session = Depends(get_db)):
-    qn = (q or "").strip().lower()
-    all_clients = db.query(Client).order_by(Client.name.asc()).all()
-    if qn:
-        filtered = [c for c in all_clients if qn in (c.name or "").lower() or qn in (c.phone or "")]
+CLIENTS_PAGE_SIZE = 50
+
+# last_visit / visit_count se mantienen al guardar turnos (sin recorrer los
+# turnos del cliente en cada vista). Devuelven sentencias para poder usarlas
+# tanto con Session como con AsyncSession.
+def visit_added(client_id: int, d: date, n: int = 1):
+    return update(Client).where(Client.id == client_id).values(
+        visit_count=func.coalesce(Client.visit_count, 0) + n,
+        last_visit=func.max(func.coalesce(Client.last_visit, d), d),
+    ).execution_options(synchronize_session=False)
+
+def visit_removed(client_id: int, d: date):
+    # solo si era la última visita hay que buscar la anterior (índice por cliente)
+    dates = union_all(*(
+        select(model.date).where(model.client_id == client_id, model.status != "CANCELADO")
+        for model in (Appointment, AppointmentArchive)
+    )).subquery()
+    previous = select(func.max(dates.c.date)).scalar_subquery()
+    return update(Client).where(Client.id == client_id).values(
+        visit_count=func.max(func.coalesce(Client.visit_count, 0) - 1, 0),
+        last_visit=case((Client.last_visit == d, previous), else_=Client.last_visit),
+    ).execution_options(synchronize_session=False)
+
+def search_clients(db: Session, q: str, limit: int, offset: int = 0, order: str = "nombre") -> tuple[list, bool]:
+    """
+    Busca por nombre o teléfono (substring, sin importar mayúsculas).
+    Con FTS5 usa el índice trigram `clients_fts`; para búsquedas de menos de
+    3 caracteres (o sin FTS5) cae a LIKE.
+    `order`: "nombre" o "reciente" (última visita primero, índice ix_clients_recent).
+    Devuelve (filas id/name/phone/last_visit/visit_count, hay_más).
+    """
+    qs = (q or "").strip()
+    digits = _digits(qs)
+    by_phone = bool(digits) and not any(ch.isalpha() for ch in qs)
+    term = digits if by_phone else qs
+
+    query = db.query(Client.id, Client.name, Client.phone, Client.last_visit, Client.visit_count)
+    if term and migrations.CLIENT_FTS and len(term) >= 3:
+        col = "phone_digits" if by_phone else "name"
+        match = f'{col} : "' + term.replace('"', '""') + '"'
+        matching = text("SELECT rowid FROM clients_fts WHERE clients_fts MATCH :m").bindparams(m=match)
+        query = query.filter(Client.id.in_(matching.columns(column("rowid"))))
+    elif term:
+        if by_phone:
+            query = query.filter(Client.phone_digits.contains(term, autoescape=True))
+        else:
+            query = query.filter(or_(
+                func.lower(Client.name).contains(term.lower(), autoescape=True),
+                Client.phone.contains(term, autoescape=True),
+            ))
+
+    if order == "reciente":
+        query = query.order_by(Client.last_visit.desc(), Client.id.desc())
     else:
-        filtered = all_clients
+        query = query.order_by(Client.name.asc(), Client.id.asc())
+    rows = query.limit(limit + 1).offset(offset).all()
+    return rows[:limit], len(rows) > limit
+
+@app.get("/clientes", response_class=HTMLResponse)
+def clientes(
+    request: Request,
+    q: str = "",
+    page: int = 1,
+    orden: str = "nombre",
+    creados: int | None = None,
+    fusionados: int = 0,
+    omitidos: int = 0,
+    db: Session = Depends(get_db),
+):
+    page = max(1, page)
+    orden = "reciente" if orden == "reciente" else "nombre"
+    clients, has_more = search_clients(db, q, CLIENTS_PAGE_SIZE, (page - 1) * CLIENTS_PAGE_SIZE, orden)
+
+    return templates.TemplateResponse("clientes.html", {
+        "request": request,
+        "clients": clients,
+        "q": q,
+        "orden": orden,
+        "page": page,
+        "has_more": has_more,
+        "page_url": "/clientes?" + urllib.parse.urlencode({"q": q, "orden": orden}),
+        "imported": (None if creados is None else {"created": creados, "merged": fusionados, "skipped": omitidos}),
+    })
+
+@app.get("/clientes/inactivos", response_class=HTMLResponse)
+def clientes_inactivos(request: Request, dias: int = 90, page: int = 1, db: Session = Depends(get_db)):
+    """Clientes que vinieron alguna vez pero no en los últimos `dias` (rango sobre ix_clients_recent, cubriente)."""
+    dias = max(1, dias)
+    page = max(1, page)
+    cutoff = date.today() - timedelta(days=dias)
+    rows = db.query(Client.id, Client.name, Client.phone, Client.last_visit, Client.visit_count).filter(
+        Client.last_visit < cutoff
+    ).order_by(Client.last_visit.desc(), Client.id.desc()).limit(CLIENTS_PAGE_SIZE + 1).offset(
+        (page - 1) * CLIENTS_PAGE_SIZE
+    ).all()
 
-    # last_visit lo dejás como lo tenías (si lo manejás en templates ya ok)
     return templates.TemplateResponse("clientes.html", {
         "request": request,
-        "clients": filtered,
-        "q": q
+        "clients": rows[:CLIENTS_PAGE_SIZE],
+        "q": "",
+        "orden": "reciente",
+        "page": page,
+        "has_more": len(rows) > CLIENTS_PAGE_SIZE,
+        "page_url": f"/clientes/inactivos?dias={dias}",
+        "inactive_days": dias,
+        "imported": None,
+    })
+
+@app.get("/api/clientes/buscar")
+def api_buscar_clientes(q: str = "", limit: int = 20, offset: int = 0, db: Session = Depends(get_db)):
+    limit = min(max(1, limit), CLIENTS_PAGE_SIZE)
+    offset = max(0, offset)
+    rows, has_more = search_clients(db, q, limit, offset)
+    return JSONResponse({
+        "items": [{"id": r.id, "name": r.name, "phone": r.phone or ""} for r in rows],
+        "next_offset": (offset + limit if has_more else None),
     })
 
 @app.post("/clientes/nuevo")
@@ -194,18 +557,39 @@ def nuevo_cliente(
     db.commit()
     return RedirectResponse("/clientes", status_code=303)
 
+@app.post("/clientes/importar")
+def importar_clientes(archivo: UploadFile = File(...)):
+    csv_text = importer.decode_csv(archivo.file.read())
+    result = importer.import_clients(importer.read_rows(csv_text))
+    qs = urllib.parse.urlencode({
+        "creados": result.created, "fusionados": result.merged, "omitidos": result.skipped,
+    })
+    return RedirectResponse(f"/clientes?{qs}", status_code=303)
+
+HISTORY_LIMIT = 100
+
+def client_history(db: Session, client_id: int) -> list:
+    """Turnos activos + archivados del cliente, los más recientes primero (ix_*_client)."""
+    history = []
+    for model in (Appointment, AppointmentArchive):
+        history += db.query(model).options(joinedload(model.specialty)).filter(
+            model.client_id == client_id,
+            model.status != "CANCELADO",
+        ).order_by(model.date.desc(), model.start_time.desc()).limit(HISTORY_LIMIT).all()
+    history.sort(key=lambda a: (a.date, a.start_time), reverse=True)
+    return history[:HISTORY_LIMIT]
+
 @app.get("/clientes/{client_id}", response_class=HTMLResponse)
 def cliente_ficha(request: Request, client_id: int, db: Session = Depends(get_db)):
     c = db.query(Client).filter(Client.id == client_id).first()
     if not c:
         raise HTTPException(status_code=404, detail="Not Found")
-    # si usás last_visit en template, calculalo simple desde appointments:
-    last_appt = db.query(Appointment).filter(
-        Appointment.client_id == c.id,
-        Appointment.status != "CANCELADO"
-    ).order_by(Appointment.date.desc(), Appointment.start_time.desc()).first()
-    last = last_appt.date.strftime("%d/%m/%Y") if last_appt else "—"
-    return templates.TemplateResponse("cliente_ficha.html", {"request": request, "c": c, "last": last})
+
+    return templates.TemplateResponse("cliente_ficha.html", {
+        "request": request,
+        "c": c,
+        "history": client_history(db, c.id),
+    })
 
 @app.post("/clientes/{client_id}/editar")
 def cliente_guardar(
@@ -223,20 +607,28 @@ def cliente_guardar(
     c.phone = phone.strip()
     c.email = email.strip()
     c.notes = notes.strip()
+    # nombre / teléfono aparecen en la vista del día
+    bump_version(db, "clients")
     db.commit()
     return RedirectResponse(f"/clientes/{client_id}", status_code=303)
 
 # ---------------- ADMIN ----------------
 @app.get("/admin", response_class=HTMLResponse)
-def admin(request: Request, db: Session = Depends(get_db)):
-    specialties = db.query(Specialty).order_by(Specialty.name.asc()).all()
-    staff = db.query(Staff).order_by(Staff.name.asc()).all()
+def admin(request: Request, archivados: int | None = None, db: Session = Depends(get_db)):
+    staff, specialties = get_refdata(db)
     return templates.TemplateResponse("admin.html", {
         "request": request,
         "specialties": specialties,
-        "staff": staff
+        "staff": staff,
+        "archivados": archivados,
+        "archive_days": archive.ARCHIVE_AFTER_DAYS,
     })
 
+@app.post("/admin/archivar")
+def admin_archivar():
+    result = archive.archive_appointments()
+    return RedirectResponse(f"/admin?archivados={result.moved}", status_code=303)
+
 @app.post("/admin/especialidades/nueva")
 def nueva_especialidad(
     name: str = Form(...),
@@ -244,12 +636,14 @@ def nueva_especialidad(
     db: Session = Depends(get_db),
 ):
     db.add(Specialty(name=name.strip().upper(), color_hex=color_hex.strip()))
+    bump_version(db, "refdata")
     db.commit()
     return RedirectResponse("/admin", status_code=303)
 
 @app.post("/admin/staff/nuevo")
 def nuevo_staff(name: str = Form(...), db: Session = Depends(get_db)):
     db.add(Staff(name=name.strip().upper()))
+    bump_version(db, "refdata")
     db.commit()
     return RedirectResponse("/admin", status_code=303)
 
@@ -259,6 +653,7 @@ def borrar_especialidad(sid: int, db: Session = Depends(get_db)):
     if not sp:
         raise HTTPException(status_code=404, detail="Not Found")
     db.delete(sp)
+    bump_version(db, "refdata")
     db.commit()
     return RedirectResponse("/admin", status_code=303)
 
@@ -268,58 +663,124 @@ def borrar_staff(sid: int, db: Session = Depends(get_db)):
     if not st:
         raise HTTPException(status_code=404, detail="Not Found")
     db.delete(st)
+    bump_version(db, "refdata")
     db.commit()
     return RedirectResponse("/admin", status_code=303)
 
 # ---------------- TURNOS ----------------
+# cache del "próximo día con turnos": vale para el día de hoy y mientras no
+# cambie la versión "appointments" de app_meta, que suben los handlers que
+# crean / editan / cancelan turnos (así también se entera otro worker)
+_next_open = {"today": None, "version": None, "date": None}
+
+def publish_slots(d: date, staff_id: int | None, salon: int | None, start_t: time, dur_min: int | None):
+    """Avisa a las vistas abiertas de ese día qué rango de horarios cambió (ver live.py)."""
+    start = _minutes(start_t)
+    end = max(start + int(dur_min or 0), start + SLOT_STEP_MIN)
+    live.broker.publish(day_key(d, staff_id, salon), {
+        "type": "change",
+        "desde": _hhmm(start - start % SLOT_STEP_MIN),
+        "hasta": _hhmm(end),
+    })
+
 def nearest_open_date(db: Session) -> date:
     today = date.today()
-    appts = db.query(Appointment).filter(
+    version = get_version(db, "appointments")
+    if _next_open["today"] == today and _next_open["version"] == version:
+        return _next_open["date"]
+
+    first = db.query(func.min(Appointment.date)).filter(
+        Appointment.date >= today,
         Appointment.status != "CANCELADO"
-    ).order_by(Appointment.date.asc()).all()
-    for a in appts:
-        if a.date >= today:
-            return a.date
-    return today
+    ).scalar()
+    d = first or today
+    _next_open["date"] = d
+    _next_open["today"] = today
+    _next_open["version"] = version
+    return d
+
+def _parse_skipped(omitidos: str) -> list[str]:
+    # fechas de un turno recurrente que no se pudieron agendar (ver turnos_crear)
+    out = []
+    for part in (omitidos or "").split(","):
+        try:
+            out.append(datetime.strptime(part.strip(), "%Y-%m-%d").strftime("%d/%m/%Y"))
+        except ValueError:
+            continue
+    return out
+
+def day_view_query(d: date, staff_id: int, salon: int, model=Appointment):
+    # client / specialty en el mismo SELECT: el template los usa en cada turno
+    q = select(model).options(
+        joinedload(model.client),
+        joinedload(model.specialty),
+    ).where(
+        model.date == d,
+        model.status != "CANCELADO",
+        model.salon == salon
+    )
+    if staff_id:
+        q = q.where(model.staff_id == staff_id)
+    return q.order_by(model.start_time.asc())
+
+async def load_day_appts(db: AsyncSession, d: date, staff_id: int, salon: int, archived_before: int) -> list:
+    appts = list((await db.execute(day_view_query(d, staff_id, salon))).scalars().all())
+    if d.toordinal() < archived_before:
+        # día ya archivado (archive.py): sus turnos viven en appointments_archive
+        appts += (await db.execute(day_view_query(d, staff_id, salon, AppointmentArchive))).scalars().all()
+        appts.sort(key=lambda a: a.start_time)
+    return appts
+
+# HTML ya renderizado de /turnos por (fecha, staff, salón) -> (etag, body)
+DAY_HTML_CACHE_SIZE = 256
+_day_html: OrderedDict = OrderedDict()
+
+# si cambian los templates (deploy) cambian todos los ETag
+TEMPLATES_STAMP = str(int(max(
+    (os.path.getmtime(os.path.join("templates", n)) for n in os.listdir("templates")), default=0
+)))
 
 @app.get("/turnos", response_class=HTMLResponse)
-def turnos(request: Request, date_str: str = "", staff_id: int = 0, salon: int = 1, db: Session = Depends(get_db)):
+async def turnos(request: Request, date_str: str = "", staff_id: int = 0, salon: int = 1, omitidos: str = "", db: AsyncSession = Depends(get_async_db)):
     # fecha
     if date_str:
         try:
             selected_date = datetime.strptime(date_str, "%Y-%m-%d").date()
         except:
-            selected_date = nearest_open_date(db)
+            selected_date = await db.run_sync(nearest_open_date)
     else:
-        selected_date = nearest_open_date(db)
+        selected_date = await db.run_sync(nearest_open_date)
 
-    staffs = db.query(Staff).order_by(Staff.name.asc()).all()
+    staffs, _ = await db.run_sync(get_refdata)
     if staff_id == 0 and staffs:
         staff_id = staffs[0].id
 
     if salon not in (1, 2):
         salon = 1
 
-    q = db.query(Appointment).filter(
-        Appointment.date == selected_date,
-        Appointment.status != "CANCELADO",
-        Appointment.salon == salon
-    )
-    if staff_id:
-        q = q.filter(Appointment.staff_id == staff_id)
+    skipped_dates = _parse_skipped(omitidos)
+    cache_key = (selected_date, staff_id, salon)
+    versions = await db.run_sync(get_versions, [day_key(selected_date, staff_id, salon), "refdata", "clients", "archived_before"])
+    stamp = ":".join([TEMPLATES_STAMP, selected_date.isoformat(), str(staff_id), str(salon)] + [str(v) for v in versions.values()])
+    etag = '"' + hashlib.sha1(stamp.encode()).hexdigest()[:20] + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
 
-    day_appts = q.order_by(Appointment.start_time.asc()).all()
+    # el aviso de fechas omitidas es de una sola vez: esa respuesta no se cachea
+    if not skipped_dates:
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        cached = _day_html.get(cache_key)
+        if cached and cached[0] == etag:
+            _day_html.move_to_end(cache_key)
+            return HTMLResponse(cached[1], headers=headers)
 
-    slot_state = build_slot_state(SLOTS, day_appts)
+    day_appts = await load_day_appts(db, selected_date, staff_id, salon, versions["archived_before"])
 
-    open_dates = db.query(Appointment.date).filter(
-        Appointment.status != "CANCELADO"
-    ).distinct().all()
-    open_dates = sorted({d[0].strftime("%Y-%m-%d") for d in open_dates})
+    slot_state = build_slot_state(SLOTS, day_appts)
 
     weekday_labels = ["LUNES","MARTES","MIÉRCOLES","JUEVES","VIERNES","SÁBADO","DOMINGO"]
 
-    return templates.TemplateResponse("turnos.html", {
+    response = templates.TemplateResponse("turnos.html", {
         "request": request,
         "selected_date": selected_date.strftime("%Y-%m-%d"),
         "selected_date_label": selected_date.strftime("%d/%m/%Y"),
@@ -329,19 +790,338 @@ def turnos(request: Request, date_str: str = "", staff_id: int = 0, salon: int =
         "staffs": staffs,
         "staff_id": staff_id,
         "salon": salon,
-        "open_dates": open_dates,
+        "skipped_dates": skipped_dates,
+        "day_version": versions[day_key(selected_date, staff_id, salon)],
         "studio_wa": STUDIO_WA_NUMBER
     })
+    if skipped_dates:
+        return response
+
+    response.headers.update(headers)
+    _day_html[cache_key] = (etag, response.body)
+    _day_html.move_to_end(cache_key)
+    while len(_day_html) > DAY_HTML_CACHE_SIZE:
+        _day_html.popitem(last=False)
+    return response
+
+# ===== CALENDARIO (turnos por día, un mes a la vez) =====
+@app.get("/api/calendario")
+def api_calendario(
+    request: Request,
+    mes: str,
+    staff_id: int = 0,
+    salon: int = 0,
+    db: Session = Depends(get_db),
+):
+    try:
+        first = datetime.strptime(mes, "%Y-%m").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Mes inválido (YYYY-MM)")
+    next_first = (first + timedelta(days=32)).replace(day=1)
+
+    # rango sobre ix_appointments_day (índice cubriente: no toca la tabla),
+    # más el archivo si el mes empieza en días ya archivados
+    models = [Appointment]
+    if first.toordinal() < get_version(db, "archived_before"):
+        models.append(AppointmentArchive)
+
+    days = {}
+    for model in models:
+        q = db.query(
+            model.date,
+            model.staff_id,
+            func.count(model.id),
+            func.sum(model.duration_min),
+        ).filter(
+            model.date >= first,
+            model.date < next_first,
+            model.status != "CANCELADO",
+        )
+        if salon:
+            q = q.filter(model.salon == salon)
+        if staff_id:
+            q = q.filter(model.staff_id == staff_id)
+
+        for d, st_id, count, minutes in q.group_by(model.date, model.staff_id):
+            day = days.setdefault(d.strftime("%Y-%m-%d"), {"count": 0, "staff_minutes": {}})
+            day["count"] += count
+            staff_minutes = day["staff_minutes"]
+            key = str(st_id or 0)
+            staff_minutes[key] = staff_minutes.get(key, 0) + int(minutes or 0)
+
+    payload = {"month": first.strftime("%Y-%m"), "days": days}
+    body = json.dumps(payload, separators=(",", ":"), sort_keys=True)
+    etag = '"' + hashlib.sha1(body.encode()).hexdigest()[:20] + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+# ===== REPORTES (solo daily_rollups) =====
+def _month_range(mes: str) -> tuple[date, date]:
+    try:
+        first = datetime.strptime(mes, "%Y-%m").date() if mes else date.today().replace(day=1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Mes inválido (YYYY-MM)")
+    return first, (first + timedelta(days=32)).replace(day=1)
+
+def month_report(db: Session, mes: str, salon: int = 0) -> dict:
+    first, next_first = _month_range(mes)
+    report = reports.monthly_report(db, first, next_first, len(SLOTS) * SLOT_STEP_MIN, salon)
+    report["month"] = first.strftime("%Y-%m")
+    return report
+
+@app.get("/api/reportes")
+def api_reportes(mes: str = "", salon: int = 0, db: Session = Depends(get_db)):
+    return JSONResponse(month_report(db, mes, salon))
+
+@app.get("/reportes", response_class=HTMLResponse)
+def reportes(request: Request, mes: str = "", salon: int = 0, db: Session = Depends(get_db)):
+    report = month_report(db, mes, salon)
+    staff, specialties = get_refdata(db)
+    first = datetime.strptime(report["month"], "%Y-%m").date()
+
+    return templates.TemplateResponse("reportes.html", {
+        "request": request,
+        "r": report,
+        "salon": salon,
+        "staff_names": {st.id: st.name for st in staff},
+        "specialty_names": {sp.id: sp.name for sp in specialties},
+        "prev_month": (first - timedelta(days=1)).strftime("%Y-%m"),
+        "next_month": (first + timedelta(days=32)).strftime("%Y-%m"),
+    })
+
+# ===== PRÓXIMOS HORARIOS LIBRES (todos los staff, varios días) =====
+AVAILABILITY_MAX_DAYS = 62
+
+@app.get("/api/disponibilidad")
+def api_disponibilidad(
+    desde: str = "",
+    hasta: str = "",
+    duracion: int = 30,
+    staff_id: int = 0,
+    salon: int = 1,
+    limit: int = 10,
+    db: Session = Depends(get_db),
+):
+    """
+    Primeros `limit` horarios de la grilla SLOTS donde entra un turno de
+    `duracion` minutos sin chocar (mismas reglas que assert_no_overlap) y
+    terminando dentro del horario del día. Un solo SELECT para todo el rango.
+    """
+    now = datetime.now()
+    try:
+        d_from = (datetime.strptime(desde, "%Y-%m-%d").date() if desde else now.date())
+        d_to = (datetime.strptime(hasta, "%Y-%m-%d").date() if hasta else d_from + timedelta(days=30))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fecha inválida")
+    if d_to < d_from or (d_to - d_from).days > AVAILABILITY_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Rango inválido (máximo {AVAILABILITY_MAX_DAYS} días)")
+    if duracion <= 0:
+        raise HTTPException(status_code=400, detail="Duración inválida")
+    if salon not in (1, 2):
+        salon = 1
+    limit = min(max(1, limit), 100)
+
+    staffs, _ = get_refdata(db)
+    if staff_id:
+        staffs = [st for st in staffs if st.id == staff_id]
+
+    q = db.query(
+        Appointment.id, Appointment.date, Appointment.staff_id, Appointment.start_time, Appointment.duration_min
+    ).filter(
+        Appointment.date >= d_from,
+        Appointment.date <= d_to,
+        Appointment.status != "CANCELADO",
+        Appointment.salon == salon,
+    )
+    if staff_id:
+        q = q.filter(Appointment.staff_id == staff_id)
+
+    by_key = {}
+    for appt_id, d, st_id, start_t, dur in q:
+        b_start = _minutes(start_t)
+        by_key.setdefault((d, st_id), []).append((b_start, b_start + int(dur or 0), appt_id))
+    intervals = {k: DayIntervals(v) for k, v in by_key.items()}
+    empty = DayIntervals()
+
+    slot_minutes, slot_labels = _slot_grid(tuple(SLOTS))
+    day_end = slot_minutes[-1] + SLOT_STEP_MIN
+    now_min = _minutes(now.time())
+
+    items = []
+    d = d_from
+    while d <= d_to and len(items) < limit:
+        iso = d.strftime("%Y-%m-%d")
+        for m, label in zip(slot_minutes, slot_labels):
+            if m + duracion > day_end:
+                break
+            if d == now.date() and m <= now_min:
+                continue
+            for st in staffs:
+                if intervals.get((d, st.id), empty).collides(m, m + duracion):
+                    continue
+                items.append({
+                    "date": iso,
+                    "time": label,
+                    "staff_id": st.id,
+                    "staff": st.name,
+                    "url": f"/turnos/nuevo?date_str={iso}&time_str={label}&staff_id={st.id}&salon={salon}",
+                })
+                if len(items) >= limit:
+                    break
+            if len(items) >= limit:
+                break
+        d += timedelta(days=1)
+
+    return JSONResponse({"duration": duracion, "salon": salon, "items": items})
+
+# ===== EN VIVO (SSE por fecha / staff / salón) =====
+LIVE_PING_SECONDS = 20
+
+@app.get("/turnos/live")
+async def turnos_live(request: Request, date_str: str, staff_id: int = 0, salon: int = 1, v: int = -1):
+    try:
+        d = datetime.strptime(date_str, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fecha inválida")
+    channel = day_key(d, staff_id, salon)
+
+    async def stream():
+        # primero suscribirse y después leer la versión: un commit en el medio
+        # llega como evento o ya cuenta en `current`, no se pierde
+        sub = live.broker.subscribe(channel)
+        try:
+            # si algo cambió entre que se renderizó la página y ahora, que recargue
+            async with AsyncSessionLocal() as db:
+                current = (await db.run_sync(get_versions, [channel]))[channel]
+            yield "retry: 3000\n\n"
+            if v >= 0 and v != current:
+                yield live.format_sse(live.RESYNC)
+            while True:
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), LIVE_PING_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                if event is live.RESYNC:
+                    sub.overflowed = False
+                yield live.format_sse(event)
+        finally:
+            live.broker.unsubscribe(sub)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+        # que GZipMiddleware no lo toque (bufferea y demora los eventos)
+        "Content-Encoding": "identity",
+    })
+
+@app.get("/turnos/slots", response_class=HTMLResponse)
+async def turnos_slots(
+    request: Request,
+    date_str: str,
+    staff_id: int = 0,
+    salon: int = 1,
+    desde: str = "00:00",
+    hasta: str = "23:59",
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Solo los horarios [desde, hasta) de la vista del día, para parchear la página."""
+    try:
+        d = datetime.strptime(date_str, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fecha inválida")
+
+    archived_before = await db.run_sync(get_version, "archived_before")
+    day_appts = await load_day_appts(db, d, staff_id, salon, archived_before)
+    slot_state = build_slot_state(SLOTS, day_appts)
+    labels = [t.strftime("%H:%M") for t in SLOTS]
+
+    return templates.TemplateResponse("_turnos_slots.html", {
+        "request": request,
+        "selected_date": d.strftime("%Y-%m-%d"),
+        "slots": [k for k in labels if desde <= k < hasta],
+        "slot_state": slot_state,
+        "staff_id": staff_id,
+        "salon": salon,
+    })
+
+# ===== SEMANA (todo el equipo, varios días en una grilla) =====
+WEEK_MAX_DAYS = 14
+
+@app.get("/turnos/semana", response_class=HTMLResponse)
+async def turnos_semana(request: Request, desde: str = "", dias: int = 7, salon: int = 1, db: AsyncSession = Depends(get_async_db)):
+    if desde:
+        try:
+            first = datetime.strptime(desde, "%Y-%m-%d").date()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Fecha inválida")
+    else:
+        d = await db.run_sync(nearest_open_date)
+        first = d - timedelta(days=d.weekday())  # lunes de esa semana
+    dias = min(max(1, dias), WEEK_MAX_DAYS)
+    days = [first + timedelta(days=i) for i in range(dias)]
+
+    if salon not in (1, 2):
+        salon = 1
+
+    staffs, _ = await db.run_sync(get_refdata)
+
+    # un solo rango sobre ix_appointments_day para todos los días y staff
+    # (más el archivo si la semana cae en días ya archivados)
+    models = [Appointment]
+    if days[0].toordinal() < await db.run_sync(get_version, "archived_before"):
+        models.append(AppointmentArchive)
+    appts = []
+    for model in models:
+        q = select(model).options(
+            joinedload(model.client),
+            joinedload(model.specialty),
+        ).where(
+            model.date >= days[0],
+            model.date <= days[-1],
+            model.salon == salon,
+            model.status != "CANCELADO",
+        )
+        appts += (await db.execute(q)).scalars().all()
+
+    columns = [st.id for st in staffs] or [0]
+    states = build_slot_states(
+        appts,
+        key=lambda a: (a.date, a.staff_id or 0),
+        keys=[(d, st_id) for d in days for st_id in columns],
+    )
+
+    weekday_labels = ["LUN", "MAR", "MIÉ", "JUE", "VIE", "SÁB", "DOM"]
+    return templates.TemplateResponse("turnos_semana.html", {
+        "request": request,
+        "days": [{
+            "iso": d.strftime("%Y-%m-%d"),
+            "label": f"{weekday_labels[d.weekday()]} {d.strftime('%d/%m')}",
+            "states": {st_id: states[(d, st_id)] for st_id in columns},
+        } for d in days],
+        "staffs": staffs,
+        "columns": columns,
+        "slots": [t.strftime("%H:%M") for t in SLOTS],
+        "salon": salon,
+        "dias": dias,
+        "prev_week": (days[0] - timedelta(days=dias)).strftime("%Y-%m-%d"),
+        "next_week": (days[0] + timedelta(days=dias)).strftime("%Y-%m-%d"),
+    })
 
 @app.get("/turnos/nuevo", response_class=HTMLResponse)
-def turnos_nuevo(request: Request, date_str: str = "", time_str: str = "", staff_id: int = 0, salon: int = 1, db: Session = Depends(get_db)):
-    clients = db.query(Client).order_by(Client.name.asc()).all()
-    specialties = db.query(Specialty).order_by(Specialty.name.asc()).all()
-    staff = db.query(Staff).order_by(Staff.name.asc()).all()
+def turnos_nuevo(request: Request, date_str: str = "", time_str: str = "", staff_id: int = 0, salon: int = 1, client_id: int = 0, db: Session = Depends(get_db)):
+    # solo el cliente preseleccionado; el resto se busca con /api/clientes/buscar
+    client = (db.query(Client).filter(Client.id == client_id).first() if client_id else None)
+    staff, specialties = get_refdata(db)
 
     return templates.TemplateResponse("turnos_nuevo.html", {
         "request": request,
-        "clients": clients,
+        "client": client,
         "specialties": specialties,
         "staff": staff,
         "date_str": date_str,
@@ -362,9 +1142,7 @@ def turnos_editar(
     if not a:
         raise HTTPException(status_code=404, detail="Turno no encontrado")
 
-    clients = db.query(Client).order_by(Client.name.asc()).all()
-    specialties = db.query(Specialty).order_by(Specialty.name.asc()).all()
-    staff = db.query(Staff).order_by(Staff.name.asc()).all()
+    staff, specialties = get_refdata(db)
 
     # Para que tu turno_editar.html (que usa sl.id / sl.name) NO se rompa:
     salons = [
@@ -377,7 +1155,6 @@ def turnos_editar(
         {
             "request": request,
             "a": a,
-            "clients": clients,
             "specialties": specialties,
             "staff": staff,
             "salons": salons,
@@ -407,16 +1184,40 @@ def turnos_editar_post(
 
     # parse fecha/hora
     try:
-        a.date = datetime.strptime(date_str, "%Y-%m-%d").date()
-        a.start_time = datetime.strptime(time_str, "%H:%M").time()
+        d = datetime.strptime(date_str, "%Y-%m-%d").date()
+        t = datetime.strptime(time_str, "%H:%M").time()
     except:
         raise HTTPException(status_code=400, detail="Fecha u hora inválida")
 
+    new_staff_id = (int(staff_id) if int(staff_id) > 0 else None)
+    new_salon = (int(salon_id) if int(salon_id) in (1, 2) else 1)
+
+    begin_booking_write(db)
+
+    # VALIDAR solapamiento por duración (sin contarse a sí mismo)
+    if a.status != "CANCELADO":
+        assert_no_overlap(
+            db=db,
+            d=d,
+            start_t=t,
+            dur_min=int(duration_min),
+            staff_id=new_staff_id,
+            salon=new_salon,
+            exclude_appt_id=a.id
+        )
+
+    old_client_id, old_date = a.client_id, a.date
+    before = reports.appt_values(a)
+    old_day = day_key(a.date, a.staff_id, a.salon)
+    old_start = a.start_time
+
+    a.date = d
+    a.start_time = t
     a.client_id = int(client_id)
     a.specialty_id = (int(specialty_id) if int(specialty_id) > 0 else None)
     a.duration_min = int(duration_min)
-    a.staff_id = (int(staff_id) if int(staff_id) > 0 else None)
-    a.salon = (int(salon_id) if int(salon_id) in (1, 2) else 1)
+    a.staff_id = new_staff_id
+    a.salon = new_salon
 
     paid = (deposit_paid in ("1", "on", "true", "True"))
     a.deposit_paid = paid
@@ -424,7 +1225,16 @@ def turnos_editar_post(
 
     a.notes = (notes or "").strip()
 
+    if a.status != "CANCELADO" and (old_client_id, old_date) != (a.client_id, a.date):
+        db.flush()
+        db.execute(visit_removed(old_client_id, old_date))
+        db.execute(visit_added(a.client_id, a.date))
+    reports.apply_rollups(db, removed=[before], added=[reports.appt_values(a)])
+    bump_day_versions(db, [old_day, day_key(a.date, a.staff_id, a.salon)])
+
     db.commit()
+    publish_slots(before["date"], before["staff_id"], before["salon"], old_start, before["duration_min"])
+    publish_slots(a.date, a.staff_id, a.salon, a.start_time, a.duration_min)
 
     return RedirectResponse(
         f"/turnos?date_str={a.date.strftime('%Y-%m-%d')}&staff_id={(a.staff_id or 0)}&salon={a.salon}",
@@ -442,14 +1252,180 @@ def turnos_cancelar(
     if not a:
         raise HTTPException(status_code=404, detail="Turno no encontrado")
 
-    a.status = "CANCELADO"
+    if a.status != "CANCELADO":
+        before = reports.appt_values(a)
+        a.status = "CANCELADO"
+        db.flush()
+        db.execute(visit_removed(a.client_id, a.date))
+        reports.apply_rollups(db, removed=[before], added=[reports.appt_values(a)])
+        bump_day_versions(db, [day_key(a.date, a.staff_id, a.salon)])
+        bump_version(db, "appointments")
     db.commit()
+    publish_slots(a.date, a.staff_id, a.salon, a.start_time, a.duration_min)
     return RedirectResponse("/turnos", status_code=303)
 
 
 
+# ===== ALTA EN LOTE / TURNOS RECURRENTES =====
+def recurring_dates(first: date, every_weeks: int, count: int) -> list[date]:
+    return [first + timedelta(weeks=every_weeks * i) for i in range(count)]
+
+def create_appointments_bulk(db: Session, occurrences: list[dict], first_deposit: int | None = None) -> list[dict]:
+    """
+    Crea muchos turnos de una vez. Cada ocurrencia es un dict con los campos
+    de Appointment (date, start_time, duration_min, client_id, staff_id, salon...).
+    Con `first_deposit` la seña queda en la primera ocurrencia que entra
+    (si la primera fecha choca, no se pierde).
+
+    Valida todas contra los turnos existentes con UNA query por rango de
+    fechas (y entre ellas mismas), inserta las que entran en una sola
+    transacción y devuelve el resultado de cada una en el mismo orden:
+    {"date", "time", "ok", "id" | "error"}.
+    """
+    if not occurrences:
+        return []
+
+    begin_booking_write(db)
+    salons = {o["salon"] for o in occurrences}
+    rows = db.query(
+        Appointment.id, Appointment.date, Appointment.salon, Appointment.staff_id,
+        Appointment.start_time, Appointment.duration_min,
+    ).filter(
+        Appointment.date >= min(o["date"] for o in occurrences),
+        Appointment.date <= max(o["date"] for o in occurrences),
+        Appointment.salon.in_(salons),
+        Appointment.status != "CANCELADO",
+    ).all()
+
+    # mismas reglas que assert_no_overlap: con staff se compara contra ese
+    # staff; sin staff, contra todo el salón ese día
+    by_staff, by_salon = {}, {}
+    for appt_id, d, sl, st_id, start_t, dur in rows:
+        b_start = _minutes(start_t)
+        item = (b_start, b_start + int(dur or 0), appt_id)
+        by_staff.setdefault((d, sl, st_id), []).append(item)
+        by_salon.setdefault((d, sl), []).append(item)
+    by_staff = {k: DayIntervals(v) for k, v in by_staff.items()}
+    by_salon = {k: DayIntervals(v) for k, v in by_salon.items()}
+
+    results, accepted = [], []
+    for o in occurrences:
+        a_start = _minutes(o["start_time"])
+        a_end = a_start + int(o["duration_min"])
+        res = {"date": o["date"].strftime("%Y-%m-%d"), "time": o["start_time"].strftime("%H:%M")}
+
+        salon_key = (o["date"], o["salon"])
+        if o.get("staff_id"):
+            index = by_staff.setdefault((o["date"], o["salon"], o["staff_id"]), DayIntervals())
+        else:
+            index = by_salon.setdefault(salon_key, DayIntervals())
+
+        if index.collides(a_start, a_end):
+            res.update(ok=False, error="Ese horario se superpone con otro turno (por duración).")
+        else:
+            # que las siguientes ocurrencias del lote también lo vean
+            if o.get("staff_id"):
+                index.add(a_start, a_end)
+            by_salon.setdefault(salon_key, DayIntervals()).add(a_start, a_end)
+            accepted.append((res, {"status": "ACTIVO", "wa_sent": False, **o}))
+            res["ok"] = True
+        results.append(res)
+
+    if accepted and first_deposit is not None:
+        accepted[0][1].update(deposit_paid=True, deposit_amount=first_deposit)
+
+    if accepted:
+        # un solo INSERT multi-fila; RETURNING no garantiza el orden, así que
+        # los ids se asocian por (fecha, hora, staff, salón), que no se repite
+        # entre ocurrencias aceptadas (chocarían)
+        returned = db.execute(
+            insert(Appointment).returning(
+                Appointment.id, Appointment.date, Appointment.start_time, Appointment.staff_id, Appointment.salon
+            ),
+            [values for _, values in accepted],
+        ).all()
+        per_client = {}
+        for _, values in accepted:
+            per_client.setdefault(values["client_id"], []).append(values["date"])
+        for cid, dates in per_client.items():
+            db.execute(visit_added(cid, max(dates), len(dates)))
+        reports.apply_rollups(db, added=[values for _, values in accepted])
+        bump_day_versions(db, [day_key(v["date"], v.get("staff_id"), v["salon"]) for _, v in accepted])
+        db.commit()
+        ids = {(d, t, st, sl): appt_id for appt_id, d, t, st, sl in returned}
+        for res, values in accepted:
+            res["id"] = ids.get((values["date"], values["start_time"], values.get("staff_id"), values["salon"]))
+            publish_slots(values["date"], values.get("staff_id"), values["salon"], values["start_time"], values["duration_min"])
+    return results
+
+class BulkOccurrence(BaseModel):
+    date: date
+    time: str
+    duration_min: int | None = None
+    staff_id: int | None = None
+
+class BulkAppointments(BaseModel):
+    client_id: int
+    specialty_id: int | None = None
+    staff_id: int | None = None
+    salon: int = 1
+    duration_min: int = 30
+    notes: str = ""
+    # o una lista explícita de ocurrencias...
+    occurrences: list[BulkOccurrence] = []
+    # ...o una recurrencia desde `start_date` + `start_time`
+    start_date: date | None = None
+    start_time: str | None = None
+    every_weeks: int = 0
+    count: int = 1
+
+@app.post("/api/turnos/lote")
+def api_turnos_lote(payload: BulkAppointments, db: Session = Depends(get_db)):
+    if not db.query(Client.id).filter(Client.id == payload.client_id).first():
+        raise HTTPException(status_code=404, detail="Cliente no existe")
+
+    items = list(payload.occurrences)
+    if payload.start_date and payload.start_time:
+        if payload.count < 1 or payload.count > 52 or (payload.count > 1 and payload.every_weeks < 1):
+            raise HTTPException(status_code=400, detail="Recurrencia inválida")
+        items += [
+            BulkOccurrence(date=d, time=payload.start_time)
+            for d in recurring_dates(payload.start_date, payload.every_weeks, payload.count)
+        ]
+    if not items or len(items) > 200:
+        raise HTTPException(status_code=400, detail="Entre 1 y 200 turnos por lote")
+
+    occurrences = []
+    for it in items:
+        try:
+            t = datetime.strptime(it.time, "%H:%M").time()
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Hora inválida: {it.time}")
+        staff_id = (it.staff_id if it.staff_id is not None else payload.staff_id)
+        duration = (it.duration_min if it.duration_min is not None else payload.duration_min)
+        if duration <= 0:
+            # con duración 0 no choca con nada y rompe el armado de ids después del INSERT
+            raise HTTPException(status_code=400, detail="Duración inválida")
+        occurrences.append({
+            "date": it.date,
+            "start_time": t,
+            "duration_min": int(duration),
+            "client_id": payload.client_id,
+            "specialty_id": (payload.specialty_id or None),
+            "staff_id": (staff_id or None),
+            "salon": (payload.salon if payload.salon in (1, 2) else 1),
+            "notes": payload.notes.strip(),
+        })
+
+    results = create_appointments_bulk(db, occurrences)
+    return JSONResponse({
+        "created": sum(1 for r in results if r["ok"]),
+        "conflicts": sum(1 for r in results if not r["ok"]),
+        "results": results,
+    })
+
 @app.post("/turnos/nuevo")
-def turnos_crear(
+async def turnos_crear(
     date_str: str = Form(...),
     time_str: str = Form(...),
     client_id: int = Form(0),
@@ -462,7 +1438,9 @@ def turnos_crear(
     deposit_paid: str = Form("0"),
     deposit_amount: int = Form(0),
     notes: str = Form(""),
-    db: Session = Depends(get_db),
+    repeat_weeks: int = Form(0),
+    repeat_count: int = Form(1),
+    db: AsyncSession = Depends(get_async_db),
 ):
     # parse fecha/hora
     try:
@@ -471,12 +1449,19 @@ def turnos_crear(
     except:
         raise HTTPException(status_code=400, detail="Fecha u hora inválida")
 
+    if duration_min <= 0:
+        raise HTTPException(status_code=400, detail="Duración inválida")
+
+    repeat = (repeat_weeks > 0 and repeat_count > 1)
+    if repeat and repeat_count > 52:
+        raise HTTPException(status_code=400, detail="Máximo 52 repeticiones")
+
     if salon not in (1, 2):
         salon = 1
 
     # cliente
     if client_id and client_id > 0:
-        client = db.query(Client).filter(Client.id == client_id).first()
+        client = await db.get(Client, client_id)
         if not client:
             raise HTTPException(status_code=404, detail="Cliente no existe")
     else:
@@ -484,19 +1469,52 @@ def turnos_crear(
             raise HTTPException(status_code=400, detail="Falta nombre del cliente")
         client = Client(name=new_name.strip(), phone=new_phone.strip())
         db.add(client)
-        db.commit()
-        db.refresh(client)
+        await db.commit()
+        await db.refresh(client)
+
+    if repeat:
+        # turno recurrente: todas las fechas se validan juntas y se crean las que entran
+        occurrences = [{
+            "date": od,
+            "start_time": t,
+            "duration_min": int(duration_min),
+            "client_id": client.id,
+            "specialty_id": (specialty_id if specialty_id > 0 else None),
+            "staff_id": (staff_id if staff_id > 0 else None),
+            "salon": salon,
+            "deposit_paid": False,
+            "deposit_amount": 0,
+            "notes": notes.strip(),
+        } for od in recurring_dates(d, repeat_weeks, repeat_count)]
+        # la seña corresponde al primer turno que se pudo agendar
+        results = await db.run_sync(
+            create_appointments_bulk, occurrences,
+            first_deposit=(int(deposit_amount) if deposit_paid == "1" else None),
+        )
+
+        if not any(r["ok"] for r in results):
+            raise HTTPException(
+                status_code=400,
+                detail="Ese horario se superpone con otro turno (por duración)."
+            )
+        skipped = ",".join(r["date"] for r in results if not r["ok"])
+        return RedirectResponse(
+            f"/turnos?date_str={date_str}&staff_id={staff_id}&salon={salon}" + (f"&omitidos={skipped}" if skipped else ""),
+            status_code=303
+        )
+
+    await db.run_sync(begin_booking_write)
 
     # VALIDAR solapamiento por duración
-    assert_no_overlap(
-        db=db,
+    await db.run_sync(lambda s: assert_no_overlap(
+        db=s,
         d=d,
         start_t=t,
         dur_min=int(duration_min),
         staff_id=(staff_id if staff_id > 0 else None),
         salon=salon,
         exclude_appt_id=None
-    )
+    ))
 
     appt = Appointment(
         date=d,
@@ -513,26 +1531,158 @@ def turnos_crear(
         wa_sent=False
     )
     db.add(appt)
-    db.commit()
+    await db.execute(visit_added(client.id, d))
+    await db.run_sync(reports.apply_rollups, added=[reports.appt_values(appt)])
+    await db.run_sync(bump_day_versions, [day_key(appt.date, appt.staff_id, appt.salon)])
+    await db.commit()
+    publish_slots(appt.date, appt.staff_id, appt.salon, appt.start_time, appt.duration_min)
 
     return RedirectResponse(f"/turnos?date_str={date_str}&staff_id={staff_id}&salon={salon}", status_code=303)
 
 @app.post("/turnos/{appt_id}/wa_sent")
-def mark_wa_sent(appt_id: int, db: Session = Depends(get_db)):
-    appt = db.query(Appointment).filter(Appointment.id == appt_id).first()
+async def mark_wa_sent(appt_id: int, db: AsyncSession = Depends(get_async_db)):
+    appt = await db.get(Appointment, appt_id)
     if not appt:
         raise HTTPException(status_code=404, detail="Not Found")
     appt.wa_sent = True
-    db.commit()
+    await db.run_sync(bump_day_versions, [day_key(appt.date, appt.staff_id, appt.salon)])
+    await db.commit()
+    publish_slots(appt.date, appt.staff_id, appt.salon, appt.start_time, 0)
     return JSONResponse({"ok": True})
 
 @app.get("/turnos/{appt_id}/wa_link")
-def get_wa_link(appt_id: int, db: Session = Depends(get_db)):
-    appt = db.query(Appointment).filter(Appointment.id == appt_id).first()
+async def get_wa_link(appt_id: int, db: AsyncSession = Depends(get_async_db)):
+    appt = (await db.execute(
+        select(Appointment).options(
+            joinedload(Appointment.client),
+            joinedload(Appointment.specialty),
+        ).where(Appointment.id == appt_id)
+    )).scalar_one_or_none()
     if not appt:
         raise HTTPException(status_code=404, detail="Not Found")
-    phone = normalize_ar_phone_to_wa(appt.client.phone)
-    msg = make_wa_message(appt)
-    import urllib.parse
-    url = f"https://wa.me/{phone}?text={urllib.parse.quote(msg)}"
+    url = make_wa_url(appt.client.phone, make_wa_message(appt))
     return JSONResponse({"url": url})
+
+# ===== RECORDATORIOS WA EN LOTE =====
+@app.get("/api/wa/pendientes")
+def wa_pendientes(date_str: str, staff_id: int = 0, salon: int = 0, db: Session = Depends(get_db)):
+    """Links de WhatsApp de todos los turnos del día sin recordatorio enviado (una sola query)."""
+    try:
+        d = datetime.strptime(date_str, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fecha inválida")
+
+    q = db.query(
+        Appointment.id,
+        Appointment.date,
+        Appointment.start_time,
+        Client.name,
+        Client.phone,
+        Specialty.name,
+    ).join(Client, Appointment.client_id == Client.id).outerjoin(
+        Specialty, Appointment.specialty_id == Specialty.id
+    ).filter(
+        Appointment.date == d,
+        Appointment.status != "CANCELADO",
+        or_(Appointment.wa_sent.is_(False), Appointment.wa_sent.is_(None)),
+    )
+    if salon:
+        q = q.filter(Appointment.salon == salon)
+    if staff_id:
+        q = q.filter(Appointment.staff_id == staff_id)
+
+    items = []
+    for appt_id, ad, start_t, client_name, phone, specialty_name in q.order_by(Appointment.start_time.asc()):
+        items.append({
+            "id": appt_id,
+            "time": start_t.strftime("%H:%M"),
+            "client": client_name,
+            "url": make_wa_url(phone, _wa_message(ad, start_t, client_name, specialty_name)),
+        })
+    return JSONResponse({"items": items})
+
+@app.post("/api/wa/enviados")
+def wa_enviados(ids: list[int] = Body(..., embed=True), db: Session = Depends(get_db)):
+    """Marca como enviados muchos turnos en un solo UPDATE."""
+    ids = sorted(set(ids))
+    updated = 0
+    if ids:
+        touched = db.query(Appointment.date, Appointment.staff_id, Appointment.salon, Appointment.start_time).filter(
+            Appointment.id.in_(ids)
+        ).all()
+        updated = db.query(Appointment).filter(
+            Appointment.id.in_(ids)
+        ).update({Appointment.wa_sent: True}, synchronize_session=False)
+        bump_day_versions(db, [day_key(d, st_id, sl) for d, st_id, sl, _ in touched])
+        db.commit()
+        for d, st_id, sl, start_t in touched:
+            publish_slots(d, st_id, sl, start_t, 0)
+    return JSONResponse({"ok": True, "updated": updated})
+
+
+# ===== SINCRONIZACIÓN OFFLINE (PWA) =====
+SYNC_MAX_CHANGES = 1000
+
+SYNC_APPT_FIELDS = (
+    "id", "date", "start_time", "duration_min", "client_id", "specialty_id", "staff_id", "salon",
+    "status", "deposit_paid", "deposit_amount", "wa_sent", "notes",
+)
+
+@app.get("/api/sync")
+def api_sync(since: int | None = None, db: Session = Depends(get_db)):
+    """
+    Turnos próximos (desde hoy, no cancelados) y sus clientes para tener en
+    el dispositivo. `since` es el `change_id` de la respuesta anterior:
+    sin `since` (o si ese punto ya se podó del change_log) vuelve todo con
+    `reset: true`; si no, solo lo que cambió desde entonces.
+    """
+    today = date.today()
+    pruned = get_version(db, "change_log_pruned")
+    reset = since is None or since < pruned
+    appt_cols = [getattr(Appointment, f) for f in SYNC_APPT_FIELDS]
+    has_more = False
+    deleted_appts, changed_clients = [], set()
+
+    if reset:
+        # primero el id: lo que cambie mientras se lee vuelve en el próximo sync
+        # (con el change_log podado entero, el último id podado: si no, el
+        # próximo sync volvería a dar reset)
+        change_id = max(db.query(func.max(ChangeLog.id)).scalar() or 0, pruned)
+        appts = db.query(*appt_cols).filter(
+            Appointment.date >= today,
+            Appointment.status != "CANCELADO",
+        ).order_by(Appointment.date, Appointment.start_time).all()
+    else:
+        changes = db.query(ChangeLog.id, ChangeLog.table_name, ChangeLog.row_id).filter(
+            ChangeLog.id > since
+        ).order_by(ChangeLog.id).limit(SYNC_MAX_CHANGES + 1).all()
+        has_more = len(changes) > SYNC_MAX_CHANGES
+        changes = changes[:SYNC_MAX_CHANGES]
+        change_id = changes[-1].id if changes else since
+
+        appt_ids = {c.row_id for c in changes if c.table_name == "appointments"}
+        changed_clients = {c.row_id for c in changes if c.table_name == "clients"}
+        appts = db.query(*appt_cols).filter(
+            Appointment.id.in_(appt_ids),
+            Appointment.date >= today,
+            Appointment.status != "CANCELADO",
+        ).all() if appt_ids else []
+        # borrados, archivados, cancelados o ya pasados: se sacan del dispositivo
+        deleted_appts = sorted(appt_ids - {a.id for a in appts})
+
+    client_ids = changed_clients | {a.client_id for a in appts}
+    clients = db.query(Client.id, Client.name, Client.phone).filter(
+        Client.id.in_(client_ids)
+    ).all() if client_ids else []
+
+    return JSONResponse({
+        "change_id": change_id,
+        "reset": reset,
+        "has_more": has_more,
+        "appointments": [
+            {f: _export_value(v) for f, v in zip(SYNC_APPT_FIELDS, a)} for a in appts
+        ],
+        "deleted_appointments": deleted_appts,
+        "clients": [{"id": c.id, "name": c.name, "phone": c.phone or ""} for c in clients],
+        "deleted_clients": sorted(changed_clients - {c.id for c in clients}),
+    })
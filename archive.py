@@ -0,0 +1,99 @@
+"""
+Mueve turnos cancelados y turnos viejos de `appointments` a
+`appointments_archive`, para que las consultas del día / solapamiento /
+disponibilidad trabajen sobre una tabla chica.
+
+    python archive.py --dias 180
+
+También poda `change_log` (lo que usa /api/sync) más viejo que
+CHANGE_LOG_KEEP_DAYS; un dispositivo que sincronizó antes de eso recibe
+`reset` y vuelve a bajar todo.
+"""
+import argparse
+import sys
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import DateTime, delete, func, insert, literal, or_, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from db import engine
+from models import Appointment, AppointmentArchive, AppMeta, ChangeLog
+
+ARCHIVE_AFTER_DAYS = 180
+CHANGE_LOG_KEEP_DAYS = 30
+BATCH_SIZE = 5000
+
+COLUMNS = [c.name for c in Appointment.__table__.columns]
+
+
+@dataclass
+class ArchiveResult:
+    moved: int = 0
+    pruned_changes: int = 0
+
+
+def archive_cutoff(days: int = ARCHIVE_AFTER_DAYS) -> date:
+    return date.today() - timedelta(days=days)
+
+
+def _set_meta(conn, key: str, value: int):
+    # como bump_version, pero fijando el valor (nunca para atrás)
+    stmt = sqlite_insert(AppMeta).values(key=key, value=value)
+    conn.execute(stmt.on_conflict_do_update(
+        index_elements=[AppMeta.key],
+        set_={"value": func.max(AppMeta.value, stmt.excluded.value)},
+    ))
+
+
+def archive_appointments(bind=engine, days: int = ARCHIVE_AFTER_DAYS, batch_size: int = BATCH_SIZE) -> ArchiveResult:
+    """
+    Cancelados (de cualquier fecha) y turnos anteriores a hoy - `days`.
+    Por lotes cortos para no tener la base bloqueada mucho tiempo.
+    """
+    result = ArchiveResult()
+    cutoff = archive_cutoff(days)
+    movable = or_(Appointment.status == "CANCELADO", Appointment.date < cutoff)
+    cols = [getattr(Appointment, c) for c in COLUMNS]
+
+    while True:
+        with bind.begin() as conn:
+            ids = conn.execute(
+                select(Appointment.id).where(movable).order_by(Appointment.id).limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                # desde acá para atrás los días viven en el archivo (ver /turnos)
+                _set_meta(conn, "archived_before", cutoff.toordinal())
+                break
+            conn.execute(insert(AppointmentArchive).from_select(
+                COLUMNS + ["archived_at"],
+                select(*cols, literal(datetime.now(), DateTime)).where(Appointment.id.in_(ids)),
+            ))
+            conn.execute(delete(Appointment).where(Appointment.id.in_(ids)))
+            result.moved += len(ids)
+
+    with bind.begin() as conn:
+        # changed_at lo pone SQLite (CURRENT_TIMESTAMP, UTC)
+        keep_from = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=CHANGE_LOG_KEEP_DAYS)
+        last_pruned = conn.execute(
+            select(func.max(ChangeLog.id)).where(ChangeLog.changed_at < keep_from)
+        ).scalar()
+        if last_pruned:
+            result.pruned_changes = conn.execute(delete(ChangeLog).where(ChangeLog.id <= last_pruned)).rowcount
+            _set_meta(conn, "change_log_pruned", last_pruned)
+    return result
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--dias", type=int, default=ARCHIVE_AFTER_DAYS, help="archivar turnos anteriores a hoy - N días")
+    args = p.parse_args(argv)
+
+    import migrations
+    migrations.migrate(engine)
+    result = archive_appointments(engine, args.dias)
+    print(f"archivados {result.moved} · change_log podado {result.pruned_changes}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,566 @@
+"""
+Datos sintéticos + benchmarks del motor de turnos.
+
+    python bench.py seed bench.db --clients 5000 --years 3
+    python bench.py run bench.db --out resultados.json
+    python bench.py load bench.db --clients 40 --out carga.json
+    python bench.py compare antes.json despues.json
+
+`seed` llena un SQLite con clientes, staff, especialidades y años de turnos
+(con cancelados y duraciones largas), siempre igual para la misma semilla.
+`run` mide las funciones del motor y las rutas principales (TestClient) y
+guarda los tiempos en JSON para comparar entre commits.
+`load` levanta uvicorn (un worker) sobre una copia de la base y le manda
+clientes concurrentes (2/3 GET /turnos, 1/3 POST /turnos/nuevo) midiendo
+p50 / p95 por tipo. Con `--app-dir` corre la app de otro checkout, ej.
+`git worktree add ../antes <commit>` para comparar sync contra async.
+`--lock-ms` / `--slow-writers` agregan el caso que el async tiene que
+aguantar: otra conexión con el lock de escritura tomado y escrituras por
+rutas sync esperándolo, que ocupan el threadpool.
+"""
+import asyncio
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time as _time
+from datetime import date, datetime, time, timedelta
+
+SPECIALTIES = [
+    ("CORTE", "#60a5fa", 30),
+    ("COLOR", "#f472b6", 120),
+    ("BALAYAGE", "#f5c542", 240),
+    ("MECHAS", "#a78bfa", 180),
+    ("ALISADO", "#34d399", 150),
+    ("BRUSHING", "#fb923c", 60),
+    ("TRATAMIENTO", "#22d3ee", 90),
+]
+NOMBRES = ["María", "Ana", "Lucía", "Sofía", "Valentina", "Camila", "Julieta", "Florencia",
+           "Agustina", "Martina", "Paula", "Carla", "Romina", "Natalia", "Laura", "Silvina"]
+APELLIDOS = ["González", "Rodríguez", "Gómez", "Fernández", "López", "Díaz", "Martínez", "Pérez",
+             "García", "Sánchez", "Romero", "Sosa", "Álvarez", "Torres", "Ruiz", "Ramírez"]
+
+
+def _use_database(path: str):
+    # db.py lee DATABASE_URL al importarse: se fija antes de importar la app
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(path)}"
+
+
+# ---------------- SEED ----------------
+def seed(path: str, clients: int, staff: int, years: float, ahead_days: int, seed_value: int):
+    if os.path.exists(path):
+        raise SystemExit(f"{path} ya existe (usá otro nombre o borralo)")
+    _use_database(path)
+
+    from sqlalchemy import insert
+    from db import engine
+    from models import Specialty, Staff, Client, Appointment
+    from phones import normalize_ar_phone_to_wa
+    import migrations
+    import reports
+
+    rnd = random.Random(seed_value)
+    migrations.migrate(engine)
+    t0 = _time.perf_counter()
+
+    with engine.begin() as conn:
+        conn.execute(insert(Specialty), [
+            {"id": i + 1, "name": name, "color_hex": color} for i, (name, color, _) in enumerate(SPECIALTIES)
+        ])
+        conn.execute(insert(Staff), [{"id": i + 1, "name": f"STAFF {i + 1}"} for i in range(staff)])
+
+        rows = []
+        for i in range(clients):
+            phone = f"11{rnd.randrange(10**8):08d}"
+            rows.append({
+                "id": i + 1,
+                "name": f"{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)} {i + 1}",
+                "phone": phone,
+                "phone_digits": normalize_ar_phone_to_wa(phone),
+                "email": "",
+                "notes": "",
+            })
+        conn.execute(insert(Client), rows)
+
+        # turnos: martes a sábado, cada staff llena su día sin solaparse
+        today = date.today()
+        d = today - timedelta(days=int(years * 365))
+        end = today + timedelta(days=ahead_days)
+        grid = [8 * 60 + 30 * k for k in range(23)]  # 08:00 .. 19:00
+        appts = []
+        while d <= end:
+            if d.weekday() in (1, 2, 3, 4, 5):
+                for st in range(1, staff + 1):
+                    m = grid[0]
+                    while m <= grid[-1]:
+                        if rnd.random() < 0.35:  # hueco libre
+                            m += 30
+                            continue
+                        sp = rnd.randrange(len(SPECIALTIES))
+                        dur = SPECIALTIES[sp][2]
+                        cancelled = rnd.random() < 0.08
+                        paid = rnd.random() < 0.4
+                        appts.append({
+                            "date": d,
+                            "start_time": time(m // 60, m % 60),
+                            "duration_min": dur,
+                            "client_id": rnd.randint(1, clients),
+                            "specialty_id": sp + 1,
+                            "staff_id": st,
+                            "salon": 1,
+                            "deposit_paid": paid,
+                            "deposit_amount": (rnd.choice([5000, 10000, 15000]) if paid else 0),
+                            "notes": "",
+                            "status": ("CANCELADO" if cancelled else "ACTIVO"),
+                            "wa_sent": d < today,
+                        })
+                        # un cancelado libera el horario
+                        m += (30 if cancelled else dur)
+            d += timedelta(days=1)
+            if len(appts) >= 20000:
+                conn.execute(insert(Appointment), appts)
+                appts = []
+        if appts:
+            conn.execute(insert(Appointment), appts)
+        # los inserts van por core: last_visit / visit_count y daily_rollups como los deja la app
+        migrations.rebuild_visits(conn)
+        reports.rebuild_rollups(conn)
+
+    total = _count_rows(engine)
+    print(f"{path}: {total} en {(_time.perf_counter() - t0):.1f}s")
+
+
+def _count_rows(engine) -> dict:
+    with engine.connect() as conn:
+        return {
+            t: conn.exec_driver_sql(f"SELECT COUNT(*) FROM {t}").scalar()
+            for t in ("clients", "staff", "specialties", "appointments")
+        }
+
+
+# ---------------- RUN ----------------
+def _timeit(fn, repeat: int) -> dict:
+    fn()  # warm-up
+    samples = []
+    for _ in range(repeat):
+        t = _time.perf_counter()
+        fn()
+        samples.append((_time.perf_counter() - t) * 1000)
+    samples.sort()
+    return {
+        "repeat": repeat,
+        "min_ms": round(samples[0], 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+    }
+
+
+def _git_commit(cwd: str | None = None) -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=cwd or os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(path: str, repeat: int, out: str | None, only: str | None):
+    if not os.path.exists(path):
+        raise SystemExit(f"{path} no existe (generalo con `python bench.py seed {path}`)")
+    _use_database(path)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))  # templates/ y static/
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import func
+    from db import SessionLocal, engine, count_queries
+    from models import Appointment, Client
+    import app as app_module
+
+    client = TestClient(app_module.app)
+    db = SessionLocal()
+
+    # día más cargado (para los casos "día denso") y datos para las rutas
+    dense_date, dense_staff = db.query(Appointment.date, Appointment.staff_id).filter(
+        Appointment.status != "CANCELADO"
+    ).group_by(Appointment.date, Appointment.staff_id).order_by(func.count().desc()).first()
+    dense_appts = db.query(Appointment).filter(
+        Appointment.date == dense_date,
+        Appointment.staff_id == dense_staff,
+        Appointment.status != "CANCELADO",
+    ).all()
+    some_name = db.query(Client.name).order_by(Client.id).first()[0].split()[1][:4]
+    dense_iso = dense_date.strftime("%Y-%m-%d")
+
+    def nearest_uncached():
+        app_module._next_open["today"] = None
+        app_module.nearest_open_date(db)
+
+    def overlap_check():
+        try:
+            app_module.assert_no_overlap(db, dense_date, time(12, 0), 60, dense_staff, 1)
+        except app_module.HTTPException:
+            pass
+
+    staff_ids = [st.id for st in app_module.get_refdata(db)[0]]
+    week_start = dense_date - timedelta(days=dense_date.weekday())
+    week_iso = week_start.strftime("%Y-%m-%d")
+
+    def week_via_day_views():
+        # lo mismo que /turnos/semana pero con una vista del día por staff y día
+        for i in range(7):
+            day = (week_start + timedelta(days=i)).strftime("%Y-%m-%d")
+            for st_id in staff_ids:
+                app_module._day_html.clear()
+                r = client.get(f"/turnos?date_str={day}&staff_id={st_id}&salon=1")
+                assert r.status_code == 200
+
+    functions = {
+        "build_slot_state/dense_day": lambda: app_module.build_slot_state(app_module.SLOTS, dense_appts),
+        "assert_no_overlap/dense_day": overlap_check,
+        "nearest_open_date/uncached": nearest_uncached,
+        "search_clients/name": lambda: app_module.search_clients(db, some_name, app_module.CLIENTS_PAGE_SIZE),
+        "search_clients/phone": lambda: app_module.search_clients(db, "1123", app_module.CLIENTS_PAGE_SIZE),
+        "semana via 7 x staff GET /turnos": week_via_day_views,
+    }
+    routes = {
+        "GET /turnos (home)": "/turnos",
+        "GET /turnos?date_str=dense": f"/turnos?date_str={dense_iso}&staff_id={dense_staff}&salon=1",
+        "GET /clientes": "/clientes",
+        "GET /clientes?q=name": f"/clientes?q={some_name}",
+        "GET /api/clientes/buscar": f"/api/clientes/buscar?q={some_name}",
+        "GET /turnos/nuevo": f"/turnos/nuevo?date_str={dense_iso}",
+        "GET /api/calendario": f"/api/calendario?mes={dense_date.strftime('%Y-%m')}",
+        "GET /api/wa/pendientes": f"/api/wa/pendientes?date_str={dense_iso}",
+        "GET /turnos/semana": f"/turnos/semana?desde={week_iso}&salon=1",
+        "GET /api/reportes": f"/api/reportes?mes={dense_date.strftime('%Y-%m')}",
+        "GET /api/disponibilidad (mes)": f"/api/disponibilidad?desde={dense_iso}&duracion=240&limit=50",
+    }
+
+    results = {}
+    for name, fn in functions.items():
+        if only and only not in name:
+            continue
+        results[name] = _timeit(fn, repeat)
+        print(f"{name:40s} {results[name]['median_ms']:9.3f} ms (p95 {results[name]['p95_ms']:.3f})")
+
+    for name, url in routes.items():
+        if only and only not in name:
+            continue
+
+        def hit(url=url):
+            r = client.get(url)
+            assert r.status_code == 200, (url, r.status_code)
+
+        with count_queries() as qc:
+            hit()
+        results[name] = _timeit(hit, repeat)
+        results[name]["sql_statements"] = qc.count
+        print(f"{name:40s} {results[name]['median_ms']:9.3f} ms (p95 {results[name]['p95_ms']:.3f}, {qc.count} SQL)")
+
+    db.close()
+    report = {
+        "commit": _git_commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "database": os.path.basename(path),
+        "rows": _count_rows(engine),
+        "results": results,
+    }
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"-> {out}")
+
+
+# ---------------- LOAD ----------------
+def _percentiles(samples: list[float]) -> dict:
+    samples = sorted(samples)
+    if not samples:
+        return {"requests": 0}
+
+    def pct(p):
+        return round(samples[min(len(samples) - 1, int(len(samples) * p))], 1)
+
+    return {
+        "requests": len(samples),
+        "median_ms": round(statistics.median(samples), 1),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_ms": round(samples[-1], 1),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _load_targets(path: str) -> dict:
+    # directo con sqlite3: no importa la app (puede ser la de otro checkout)
+    conn = sqlite3.connect(path)
+    try:
+        staff_ids = [r[0] for r in conn.execute("SELECT id FROM staff ORDER BY id")]
+        client_ids = [r[0] for r in conn.execute("SELECT id FROM clients ORDER BY id LIMIT 500")]
+        days = [r[0] for r in conn.execute(
+            "SELECT DISTINCT date FROM appointments WHERE date <= ? ORDER BY date DESC LIMIT 60",
+            (date.today().isoformat(),),
+        )]
+        appt_ids = [r[0] for r in conn.execute(
+            "SELECT id FROM appointments WHERE date > ? ORDER BY id LIMIT 500", (date.today().isoformat(),),
+        )]
+    finally:
+        conn.close()
+    if not (staff_ids and client_ids and days and appt_ids):
+        raise SystemExit("la base no tiene staff / clientes / turnos (usá `bench.py seed`)")
+    return {"staff_ids": staff_ids, "client_ids": client_ids, "days": days, "appt_ids": appt_ids}
+
+
+async def _drive(
+    base_url: str, targets: dict, clients: int, requests: int, seed_value: int, slow_writers: int = 0,
+) -> tuple[dict, int, float]:
+    import httpx
+
+    latencies = {"GET /turnos": [], "POST /turnos/nuevo": []}
+    if slow_writers:
+        latencies["POST /api/wa/enviados"] = []
+    errors = 0
+    done = asyncio.Event()
+    # las altas van a días futuros sin turnos: algunas chocan entre sí (400), como en el mostrador
+    first_free = date.today() + timedelta(days=400)
+
+    async def worker(k: int, http):
+        nonlocal errors
+        rnd = random.Random(seed_value * 1000 + k)
+        for i in range(requests):
+            staff_id = rnd.choice(targets["staff_ids"])
+            t = _time.perf_counter()
+            try:
+                if i % 3 == 2:
+                    kind = "POST /turnos/nuevo"
+                    d = first_free + timedelta(days=rnd.randrange(60))
+                    m = 8 * 60 + 30 * rnd.randrange(22)
+                    r = await http.post("/turnos/nuevo", data={
+                        "date_str": d.isoformat(),
+                        "time_str": f"{m // 60:02d}:{m % 60:02d}",
+                        "client_id": rnd.choice(targets["client_ids"]),
+                        "staff_id": staff_id,
+                        "duration_min": 60,
+                    })
+                    ok = r.status_code in (303, 400)
+                else:
+                    kind = "GET /turnos"
+                    r = await http.get(f"/turnos?date_str={rnd.choice(targets['days'])}&staff_id={staff_id}&salon=1")
+                    ok = r.status_code == 200
+            except httpx.HTTPError:
+                ok = False  # timeout / conexión cortada: cuenta como error, no corta la corrida
+            latencies[kind].append((_time.perf_counter() - t) * 1000)
+            if not ok:
+                errors += 1
+
+    async def slow_writer(k: int, http):
+        # ruta sync que escribe: con la base bloqueada espera dentro de un hilo del threadpool
+        nonlocal errors
+        rnd = random.Random(seed_value * 1000 - k)
+        while not done.is_set():
+            t = _time.perf_counter()
+            try:
+                r = await http.post("/api/wa/enviados", json={"ids": rnd.sample(targets["appt_ids"], 5)})
+                ok = r.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            latencies["POST /api/wa/enviados"].append((_time.perf_counter() - t) * 1000)
+            if not ok:
+                errors += 1
+
+    async def foreground(http):
+        await asyncio.gather(*(worker(k, http) for k in range(clients)))
+        done.set()
+
+    total = clients + slow_writers
+    limits = httpx.Limits(max_connections=total, max_keepalive_connections=total)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as http:
+        t0 = _time.perf_counter()
+        await asyncio.gather(foreground(http), *(slow_writer(k, http) for k in range(slow_writers)))
+        elapsed = _time.perf_counter() - t0
+    return latencies, errors, elapsed
+
+
+def _hold_write_lock(path: str, lock_ms: int, stop):
+    """
+    Otra conexión que toma el lock de escritura `lock_ms` por vez (como una
+    importación o el archivado corriendo al lado) y lo suelta un momento.
+    """
+    conn = sqlite3.connect(path, isolation_level=None, timeout=60)
+    try:
+        while not stop.is_set():
+            conn.execute("BEGIN IMMEDIATE")
+            stop.wait(lock_ms / 1000)
+            conn.execute("COMMIT")
+            stop.wait(0.02)
+    finally:
+        conn.close()
+
+
+def load(
+    path: str, clients: int, requests: int, profile: str, app_dir: str | None, out: str | None, seed_value: int,
+    slow_writers: int = 0, lock_ms: int = 0,
+):
+    if not os.path.exists(path):
+        raise SystemExit(f"{path} no existe (generalo con `python bench.py seed {path}`)")
+    app_dir = os.path.abspath(app_dir or os.path.dirname(os.path.abspath(__file__)))
+    targets = _load_targets(path)
+
+    # las altas modifican la base: cada corrida arranca de la misma copia
+    workdir = tempfile.mkdtemp(prefix="bench-load-")
+    db_copy = os.path.join(workdir, os.path.basename(path))
+    shutil.copy(path, db_copy)
+
+    port = _free_port()
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{db_copy}", "DB_PROFILE": profile}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--workers", "1", "--log-level", "warning"],
+        cwd=app_dir, env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        import httpx
+        deadline = _time.monotonic() + 60
+        while True:
+            if server.poll() is not None:
+                raise SystemExit("uvicorn terminó antes de arrancar")
+            try:
+                httpx.get(base_url + f"/turnos?date_str={targets['days'][0]}", timeout=5)
+                break
+            except httpx.TransportError:
+                if _time.monotonic() > deadline:
+                    raise SystemExit("uvicorn no respondió en 60s")
+                _time.sleep(0.2)
+
+        stop = threading.Event()
+        holder = None
+        if lock_ms:
+            holder = threading.Thread(target=_hold_write_lock, args=(db_copy, lock_ms, stop), daemon=True)
+            holder.start()
+        try:
+            latencies, errors, elapsed = asyncio.run(
+                _drive(base_url, targets, clients, requests, seed_value, slow_writers)
+            )
+        finally:
+            stop.set()
+            if holder:
+                holder.join()
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    scenario = f"{clients} clientes"
+    if slow_writers or lock_ms:
+        scenario += f", {slow_writers} escrituras lentas, lock {lock_ms} ms"
+    results = {}
+    for kind, samples in latencies.items():
+        name = f"load {kind} ({scenario})"
+        results[name] = _percentiles(samples)
+        r = results[name]
+        print(f"{name:40s} p50 {r['median_ms']:8.1f} ms  p95 {r['p95_ms']:8.1f} ms  p99 {r['p99_ms']:8.1f} ms")
+    total = sum(len(v) for v in latencies.values())
+    print(f"{total} requests en {elapsed:.1f}s ({total / elapsed:.0f} req/s), errores {errors}")
+
+    report = {
+        "commit": _git_commit(app_dir),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "database": os.path.basename(path),
+        "profile": profile,
+        "clients": clients,
+        "requests_per_client": requests,
+        "slow_writers": slow_writers,
+        "lock_ms": lock_ms,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 2),
+        "results": results,
+    }
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"-> {out}")
+
+
+# ---------------- COMPARE ----------------
+def compare(before_path: str, after_path: str):
+    with open(before_path, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(after_path, encoding="utf-8") as f:
+        after = json.load(f)
+    print(f"{'caso (mediana / p95)':40s} {before.get('commit') or 'antes':>10s} {after.get('commit') or 'después':>10s}   cambio")
+    for name, res in after["results"].items():
+        old = before["results"].get(name)
+        for key in ("median_ms", "p95_ms"):
+            label = name if key == "median_ms" else "  p95"
+            if not old:
+                print(f"{label:40s} {'—':>10s} {res[key]:10.3f}")
+                continue
+            ratio = res[key] / old[key] if old[key] else float("inf")
+            print(f"{label:40s} {old[key]:10.3f} {res[key]:10.3f}   x{ratio:.2f}")
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    ps = sub.add_parser("seed", help="genera una base SQLite sintética")
+    ps.add_argument("path")
+    ps.add_argument("--clients", type=int, default=5000)
+    ps.add_argument("--staff", type=int, default=4)
+    ps.add_argument("--years", type=float, default=3)
+    ps.add_argument("--ahead-days", type=int, default=60)
+    ps.add_argument("--seed", type=int, default=42)
+
+    pr = sub.add_parser("run", help="corre los benchmarks sobre una base")
+    pr.add_argument("path")
+    pr.add_argument("--repeat", type=int, default=30)
+    pr.add_argument("--out", help="archivo JSON de resultados")
+    pr.add_argument("--only", help="solo los casos que contengan este texto")
+
+    pl = sub.add_parser("load", help="carga concurrente contra uvicorn (p50 / p95)")
+    pl.add_argument("path")
+    pl.add_argument("--clients", type=int, default=40, help="clientes concurrentes")
+    pl.add_argument("--requests", type=int, default=25, help="requests por cliente")
+    pl.add_argument("--profile", default="wal", help="DB_PROFILE del servidor")
+    pl.add_argument("--app-dir", help="checkout de la app a levantar (por defecto este)")
+    pl.add_argument("--out", help="archivo JSON de resultados")
+    pl.add_argument("--seed", type=int, default=42)
+    pl.add_argument("--slow-writers", type=int, default=0,
+                    help="clientes extra que escriben por una ruta sync (POST /api/wa/enviados)")
+    pl.add_argument("--lock-ms", type=int, default=0,
+                    help="otra conexión toma el lock de escritura de a LOCK_MS ms")
+
+    pc = sub.add_parser("compare", help="compara dos JSON de resultados")
+    pc.add_argument("before")
+    pc.add_argument("after")
+
+    args = p.parse_args(argv)
+    if args.cmd == "seed":
+        seed(args.path, args.clients, args.staff, args.years, args.ahead_days, args.seed)
+    elif args.cmd == "run":
+        run(args.path, args.repeat, args.out, args.only)
+    elif args.cmd == "load":
+        load(args.path, args.clients, args.requests, args.profile, args.app_dir, args.out, args.seed,
+             args.slow_writers, args.lock_ms)
+    else:
+        compare(args.before, args.after)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,124 @@
 import os
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
 IS_RENDER = os.getenv("RENDER") is not None
 
 # IMPORTANTE: nombre nuevo de DB en Render para arrancar limpio
-if IS_RENDER:
+if os.getenv("DATABASE_URL"):
+    DATABASE_URL = os.environ["DATABASE_URL"]
+elif IS_RENDER:
     DATABASE_URL = "sqlite:////var/data/angies_color.db"
 else:
     DATABASE_URL = "sqlite:///./angies_color.db"
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False},
-)
+# Perfil del engine (DB_PROFILE):
+# - "default": como siempre, journal rollback y pragmas de SQLite por defecto
+# - "wal": WAL + synchronous=NORMAL, los lectores no se bloquean con las
+#   escrituras y dos reservas a la vez esperan en vez de "database is locked"
+# En Render arranca en "wal" salvo que se pida otra cosa.
+DB_PROFILE = os.getenv("DB_PROFILE", "wal" if IS_RENDER else "default")
+
+SQLITE_PROFILES = {
+    "default": {
+        "pragmas": {},
+        "pool": {},
+    },
+    "wal": {
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "busy_timeout": int(os.getenv("DB_BUSY_TIMEOUT_MS", "10000")),
+            "cache_size": -16000,        # ~16 MB por conexión
+            "mmap_size": 64 * 1024 * 1024,
+            "temp_store": "MEMORY",
+        },
+        # pocas conexiones reutilizadas: SQLite tiene un solo escritor igual
+        "pool": {
+            "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+            "max_overflow": 5,
+            "pool_timeout": 30,
+        },
+    },
+}
+
+if DB_PROFILE not in SQLITE_PROFILES:
+    raise RuntimeError(f"DB_PROFILE desconocido: {DB_PROFILE!r} (opciones: {', '.join(SQLITE_PROFILES)})")
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+IS_SQLITE_MEMORY = IS_SQLITE and (DATABASE_URL in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in DATABASE_URL)
+profile = SQLITE_PROFILES[DB_PROFILE] if IS_SQLITE else SQLITE_PROFILES["default"]
+
+engine_kwargs = {}
+if IS_SQLITE:
+    engine_kwargs["connect_args"] = {"check_same_thread": False}
+if IS_SQLITE_MEMORY:
+    # una sola conexión compartida, si no cada conexión ve otra base vacía
+    engine_kwargs["poolclass"] = StaticPool
+else:
+    engine_kwargs.update(profile["pool"])
+
+engine = create_engine(DATABASE_URL, **engine_kwargs)
+
+if IS_SQLITE and profile["pragmas"]:
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        for name, value in profile["pragmas"].items():
+            cur.execute(f"PRAGMA {name}={value}")
+        cur.close()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+
+# ---------------- ASYNC ----------------
+# Mismo archivo y mismo perfil, vía aiosqlite: las rutas más usadas son
+# `async def` y no ocupan un hilo del threadpool mientras esperan a SQLite.
+# (Con una base en memoria cada engine vería su propia base vacía.)
+if IS_SQLITE:
+    ASYNC_DATABASE_URL = DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+else:
+    ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", DATABASE_URL)
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_kwargs)
+
+if IS_SQLITE and profile["pragmas"]:
+    event.listen(async_engine.sync_engine, "connect", _sqlite_pragmas)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.statements.append(statement)
+
+
+@contextmanager
+def count_queries(*binds):
+    """
+    Cuenta las sentencias SQL que se ejecutan dentro del bloque, ej. para
+    chequear que una vista corre una cantidad fija de queries:
+
+        with count_queries() as qc:
+            client.get("/turnos?date_str=...")
+        assert qc.count == 3
+
+    Sin argumentos escucha el engine sync y el async.
+    """
+    binds = binds or (engine, async_engine.sync_engine)
+    qc = QueryCounter()
+    for bind in binds:
+        event.listen(bind, "before_cursor_execute", qc._on_execute)
+    try:
+        yield qc
+    finally:
+        for bind in binds:
+            event.remove(bind, "before_cursor_execute", qc._on_execute)
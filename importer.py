@@ -0,0 +1,213 @@
+"""
+Importación masiva de clientes desde CSV (planilla o export de otro sistema).
+
+    python importer.py clientes.csv
+
+Columnas reconocidas (encabezado, sin importar mayúsculas/acentos):
+nombre/name, telefono/phone/celular/whatsapp, email/mail, notas/notes.
+Sin encabezado se toma nombre, teléfono, email, notas en ese orden.
+
+El teléfono se normaliza con `normalize_ar_phone_to_wa` y se usa para
+deduplicar contra `clients.phone_digits` (indexado) y dentro del mismo
+archivo. Las filas sin teléfono se deduplican por nombre (sin mayúsculas,
+acentos ni espacios de más) contra los clientes sin teléfono y dentro del
+archivo. Si el cliente ya existe se completan email/notas vacíos
+(fusionado); filas sin nombre o repetidas sin datos nuevos se omiten.
+"""
+import argparse
+import csv
+import io
+import sys
+import unicodedata
+from dataclasses import dataclass
+
+from sqlalchemy import bindparam, insert, or_, select, update
+
+from db import engine
+from models import Client
+from phones import normalize_ar_phone_to_wa
+
+BATCH_SIZE = 1000
+
+HEADERS = {
+    "name": ("nombre", "name", "cliente", "nombre y apellido", "apellido y nombre"),
+    "phone": ("telefono", "phone", "celular", "whatsapp", "tel", "movil"),
+    "email": ("email", "mail", "e-mail", "correo"),
+    "notes": ("notas", "notes", "observaciones", "nota"),
+}
+FIELDS = ("name", "phone", "email", "notes")
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    merged: int = 0
+    skipped: int = 0
+
+
+def _plain(s: str) -> str:
+    s = unicodedata.normalize("NFKD", (s or "").strip().lower())
+    return "".join(ch for ch in s if not unicodedata.combining(ch))
+
+
+def _name_key(name: str) -> str:
+    return " ".join(_plain(name).split())
+
+
+def decode_csv(data: bytes) -> str:
+    # Excel en castellano suele exportar en cp1252 y con ';'
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return data.decode("cp1252", errors="replace")
+
+
+def read_rows(text: str):
+    """Devuelve dicts con name/phone/email/notes a partir del texto CSV."""
+    sample = text[:4096]
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(io.StringIO(text), dialect)
+
+    first = next(reader, None)
+    if first is None:
+        return
+    positions = {}
+    for i, h in enumerate(first):
+        for field, names in HEADERS.items():
+            if _plain(h) in names and field not in positions:
+                positions[field] = i
+    if "name" not in positions:
+        # sin encabezado reconocible: orden fijo y la primera fila es un dato
+        positions = {f: i for i, f in enumerate(FIELDS)}
+        yield _pick(first, positions)
+
+    for row in reader:
+        yield _pick(row, positions)
+
+
+def _pick(row: list[str], positions: dict) -> dict:
+    return {f: (row[i].strip() if i < len(row) else "") for f, i in positions.items()}
+
+
+def import_clients(rows, bind=engine, batch_size: int = BATCH_SIZE) -> ImportResult:
+    """
+    Inserta/fusiona clientes por lotes: una consulta por lote contra el índice
+    de `phone_digits`, un INSERT y un UPDATE con executemany, una transacción.
+    Los clientes sin teléfono se leen una sola vez al empezar (por nombre).
+    """
+    result = ImportResult()
+    with bind.connect() as conn:
+        by_name = {}  # nombre normalizado -> cliente sin teléfono
+        for r in conn.execute(
+            select(Client.id, Client.name, Client.email, Client.notes)
+            .where(or_(Client.phone_digits == "", Client.phone_digits.is_(None)))
+            .order_by(Client.id)
+        ):
+            by_name.setdefault(_name_key(r.name), {"id": r.id, "email": r.email or "", "notes": r.notes or ""})
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            _import_batch(bind, batch, result, by_name)
+            batch = []
+    if batch:
+        _import_batch(bind, batch, result, by_name)
+    return result
+
+
+def _import_batch(bind, batch: list[dict], result: ImportResult, by_name: dict):
+    # los lotes anteriores ya están commiteados: los encuentra la misma consulta
+    # (y los sin teléfono quedan en `by_name`, con su id)
+    to_insert = []
+    pending = {}  # phone_digits -> fila a insertar en este lote
+    keys = set()
+    for row in batch:
+        row["name"] = row.get("name", "")
+        row["phone_digits"] = normalize_ar_phone_to_wa(row.get("phone", ""))
+        if row["name"] and row["phone_digits"]:
+            keys.add(row["phone_digits"])
+
+    with bind.begin() as conn:
+        existing = {}
+        if keys:
+            for r in conn.execute(
+                select(Client.id, Client.phone_digits, Client.email, Client.notes)
+                .where(Client.phone_digits.in_(keys))
+            ):
+                existing.setdefault(r.phone_digits, {"id": r.id, "email": r.email or "", "notes": r.notes or ""})
+
+        updates = {}  # id -> valores a completar
+        for row in batch:
+            if not row["name"]:
+                result.skipped += 1
+                continue
+            key = row["phone_digits"]
+            if key:
+                target = existing.get(key) or pending.get(key)
+            else:
+                target = by_name.get(_name_key(row["name"]))
+            if target is None:
+                new = {
+                    "name": row["name"],
+                    "phone": row.get("phone", ""),
+                    "phone_digits": key,
+                    "email": row.get("email", ""),
+                    "notes": row.get("notes", ""),
+                }
+                to_insert.append(new)
+                if key:
+                    pending[key] = new
+                else:
+                    by_name[_name_key(row["name"])] = new
+                result.created += 1
+                continue
+
+            filled = {
+                f: row[f] for f in ("email", "notes")
+                if row.get(f) and not target.get(f)
+            }
+            if not filled:
+                result.skipped += 1
+                continue
+            target.update(filled)  # si es una fila pendiente, se inserta ya completa
+            if "id" in target:
+                updates.setdefault(target["id"], {}).update(filled)
+            result.merged += 1
+
+        if to_insert:
+            # core insert: no pasa por el @validates, phone_digits va explícito
+            ids = conn.execute(
+                insert(Client).returning(Client.id, sort_by_parameter_order=True), to_insert,
+            ).scalars().all()
+            for new, cid in zip(to_insert, ids):
+                new["id"] = cid  # los de `by_name` se fusionan por id en los lotes siguientes
+        for field in ("email", "notes"):
+            params = [{"_id": cid, "_v": vals[field]} for cid, vals in updates.items() if field in vals]
+            if params:
+                conn.execute(
+                    update(Client).where(Client.id == bindparam("_id")).values({field: bindparam("_v")}),
+                    params,
+                )
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("path", help="archivo CSV")
+    p.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = p.parse_args(argv)
+
+    import migrations
+    migrations.migrate(engine)
+
+    with open(args.path, "rb") as f:
+        text = decode_csv(f.read())
+    result = import_clients(read_rows(text), engine, args.batch_size)
+    print(f"creados {result.created} · fusionados {result.merged} · omitidos {result.skipped}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
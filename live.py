@@ -0,0 +1,86 @@
+"""
+Pub/sub en memoria para las actualizaciones en vivo de la agenda (SSE).
+
+Cada vista abierta de /turnos se suscribe al canal de su (fecha, staff,
+salón) y recibe eventos chicos ("cambió tal rango de horarios"). Es por
+proceso: alcanza con un solo worker (Render free); con varios, cada uno solo
+avisa a las páginas conectadas a él.
+
+Cada suscriptor tiene una cola acotada: si un cliente lento la llena, se
+descartan sus eventos pendientes y se le manda un único "resync" para que
+recargue el día completo.
+"""
+import asyncio
+import json
+import threading
+
+QUEUE_SIZE = 64
+RESYNC = {"type": "resync"}
+
+
+class Subscription:
+    __slots__ = ("channel", "queue", "overflowed")
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.overflowed = False
+
+
+class Broker:
+    def __init__(self):
+        self._channels: dict[str, set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def subscribe(self, channel: str) -> Subscription:
+        self._loop = asyncio.get_running_loop()
+        sub = Subscription(channel)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            subs = self._channels.get(sub.channel)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._channels[sub.channel]
+
+    def publish(self, channel: str, event: dict):
+        """
+        Se puede llamar desde el loop (rutas async) o desde el threadpool
+        (rutas sync): en ese caso se reenvía al loop con call_soon_threadsafe.
+        """
+        if channel not in self._channels or self._loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._fan_out(channel, event)
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._fan_out, channel, event)
+
+    def _fan_out(self, channel: str, event: dict):
+        with self._lock:
+            subs = list(self._channels.get(channel, ()))
+        for sub in subs:
+            if sub.overflowed:
+                continue  # ya tiene un resync pendiente
+            try:
+                sub.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                while not sub.queue.empty():
+                    sub.queue.get_nowait()
+                sub.queue.put_nowait(RESYNC)
+                sub.overflowed = True
+
+
+broker = Broker()
+
+
+def format_sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
@@ -0,0 +1,208 @@
+"""
+Métricas por ruta: latencia, cantidad y tiempo de SQL, y tiempo de render
+de templates. Se exponen en formato texto de Prometheus en /metrics.
+
+Con SLOW_REQUEST_MS=<ms> se loguean los requests más lentos que ese umbral
+junto con sus queries (apagado por defecto).
+"""
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+from fastapi.templating import Jinja2Templates
+from sqlalchemy import event
+
+logger = logging.getLogger("angies.metrics")
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0") or 0)
+
+# segundos
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class RequestStats:
+    __slots__ = ("sql_count", "sql_seconds", "render_seconds", "queries")
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.render_seconds = 0.0
+        self.queries = []  # (segundos, sql) solo si el log de lentos está activo
+
+
+_current: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, b in enumerate(BUCKETS):
+            if value <= b:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = {}          # (method, route, status) -> Histogram
+        self.sql_count = {}        # (method, route) -> int
+        self.sql_seconds = {}      # (method, route) -> float
+        self.render = {}           # template -> Histogram
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        with self._lock:
+            self.latency.setdefault((method, route, str(status)), Histogram()).observe(seconds)
+            key = (method, route)
+            self.sql_count[key] = self.sql_count.get(key, 0) + stats.sql_count
+            self.sql_seconds[key] = self.sql_seconds.get(key, 0.0) + stats.sql_seconds
+
+    def observe_render(self, template: str, seconds: float):
+        with self._lock:
+            self.render.setdefault(template, Histogram()).observe(seconds)
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            lines += [
+                "# HELP http_request_duration_seconds Latencia de requests por ruta.",
+                "# TYPE http_request_duration_seconds histogram",
+            ]
+            for (method, route, status), h in sorted(self.latency.items()):
+                labels = f'method="{method}",route="{_esc(route)}",status="{status}"'
+                lines += _histogram_lines("http_request_duration_seconds", labels, h)
+
+            lines += [
+                "# HELP http_request_sql_statements_total Sentencias SQL ejecutadas por ruta.",
+                "# TYPE http_request_sql_statements_total counter",
+            ]
+            for (method, route), n in sorted(self.sql_count.items()):
+                lines.append(f'http_request_sql_statements_total{{method="{method}",route="{_esc(route)}"}} {n}')
+
+            lines += [
+                "# HELP http_request_sql_seconds_total Tiempo total en la base por ruta.",
+                "# TYPE http_request_sql_seconds_total counter",
+            ]
+            for (method, route), secs in sorted(self.sql_seconds.items()):
+                lines.append(f'http_request_sql_seconds_total{{method="{method}",route="{_esc(route)}"}} {secs:.6f}')
+
+            lines += [
+                "# HELP template_render_seconds Tiempo de render de templates.",
+                "# TYPE template_render_seconds histogram",
+            ]
+            for name, h in sorted(self.render.items()):
+                lines += _histogram_lines("template_render_seconds", f'template="{_esc(name)}"', h)
+        return "\n".join(lines) + "\n"
+
+
+def _esc(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _histogram_lines(name: str, labels: str, h: Histogram) -> list[str]:
+    out = []
+    acc = 0
+    for b, c in zip(BUCKETS, h.counts):
+        acc += c
+        out.append(f'{name}_bucket{{{labels},le="{b}"}} {acc}')
+    out.append(f'{name}_bucket{{{labels},le="+Inf"}} {h.count}')
+    out.append(f"{name}_sum{{{labels}}} {h.sum:.6f}")
+    out.append(f"{name}_count{{{labels}}} {h.count}")
+    return out
+
+
+registry = Registry()
+
+
+# ---------------- SQL ----------------
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = _current.get()
+    if stats is None:
+        return
+    stats.sql_count += 1
+    stats.sql_seconds += elapsed
+    if SLOW_REQUEST_MS:
+        stats.queries.append((elapsed, statement))
+
+
+def instrument_engine(engine):
+    """Engancha los eventos de SQLAlchemy (para async: pasar `async_engine.sync_engine`)."""
+    event.listen(engine, "before_cursor_execute", _before_execute)
+    event.listen(engine, "after_cursor_execute", _after_execute)
+
+
+# ---------------- TEMPLATES ----------------
+class TimedTemplates(Jinja2Templates):
+    """Jinja2Templates que mide el render de cada TemplateResponse."""
+
+    def TemplateResponse(self, *args, **kwargs):
+        t = time.perf_counter()
+        response = super().TemplateResponse(*args, **kwargs)
+        elapsed = time.perf_counter() - t
+
+        name = getattr(response, "template", None)
+        registry.observe_render(getattr(name, "name", None) or "?", elapsed)
+        stats = _current.get()
+        if stats is not None:
+            stats.render_seconds += elapsed
+        return response
+
+
+# ---------------- MIDDLEWARE ----------------
+class MetricsMiddleware:
+    """Middleware ASGI: mide cada request HTTP hasta el último chunk de la respuesta."""
+
+    def __init__(self, app, skip_paths=("/metrics",)):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths or scope["path"].startswith("/static"):
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = {"code": 500}
+        t = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - t
+            _current.reset(token)
+            # plantilla de la ruta (ej. /turnos/{appt_id}/editar), no el path real
+            route = getattr(scope.get("route"), "path", None) or "<sin ruta>"
+            registry.observe_request(scope["method"], route, status["code"], elapsed, stats)
+            if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+                _log_slow(scope, route, status["code"], elapsed, stats)
+
+
+def _log_slow(scope, route: str, status: int, elapsed: float, stats: RequestStats):
+    worst = sorted(stats.queries, reverse=True)[:5]
+    detail = "\n".join(f"  {secs * 1000:8.2f} ms  {' '.join(sql.split())}" for secs, sql in worst)
+    logger.warning(
+        "request lento %s %s (%s) %d -> %.1f ms | SQL %d en %.1f ms | render %.1f ms\n%s",
+        scope["method"], scope["path"], route, status, elapsed * 1000,
+        stats.sql_count, stats.sql_seconds * 1000, stats.render_seconds * 1000, detail,
+    )
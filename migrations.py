@@ -0,0 +1,197 @@
+"""
+Migraciones livianas para bases SQLite que ya existen.
+
+`Base.metadata.create_all` crea las tablas que faltan pero no toca las que
+ya están, así que acá se agregan columnas e índices nuevos de los modelos.
+"""
+from sqlalchemy import inspect
+from sqlalchemy.exc import OperationalError
+
+from db import Base, engine
+from phones import normalize_ar_phone_to_wa
+import models  # registra las tablas en Base.metadata
+import reports
+
+# True si la base tiene el índice FTS5 (trigram) de clientes; si no, la
+# búsqueda de clientes cae a LIKE
+CLIENT_FTS = False
+
+CLIENT_FTS_DDL = [
+    """CREATE VIRTUAL TABLE clients_fts USING fts5(
+        name, phone_digits, content='clients', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER clients_fts_ai AFTER INSERT ON clients BEGIN
+        INSERT INTO clients_fts(rowid, name, phone_digits) VALUES (new.id, new.name, new.phone_digits);
+    END""",
+    """CREATE TRIGGER clients_fts_ad AFTER DELETE ON clients BEGIN
+        INSERT INTO clients_fts(clients_fts, rowid, name, phone_digits) VALUES ('delete', old.id, old.name, old.phone_digits);
+    END""",
+    """CREATE TRIGGER clients_fts_au AFTER UPDATE OF name, phone_digits ON clients BEGIN
+        INSERT INTO clients_fts(clients_fts, rowid, name, phone_digits) VALUES ('delete', old.id, old.name, old.phone_digits);
+        INSERT INTO clients_fts(rowid, name, phone_digits) VALUES (new.id, new.name, new.phone_digits);
+    END""",
+    "INSERT INTO clients_fts(clients_fts) VALUES ('rebuild')",
+]
+
+
+# change_log para /api/sync: se llena desde la base para no depender de que
+# cada handler (o importación / inserción en lote) se acuerde de registrar
+CHANGE_LOG_TRIGGERS = {
+    "change_log_appointments_ai": "AFTER INSERT ON appointments BEGIN "
+        "INSERT INTO change_log(table_name, row_id, op, changed_at) VALUES ('appointments', new.id, 'I', CURRENT_TIMESTAMP); END",
+    "change_log_appointments_au": "AFTER UPDATE ON appointments BEGIN "
+        "INSERT INTO change_log(table_name, row_id, op, changed_at) VALUES ('appointments', new.id, 'U', CURRENT_TIMESTAMP); END",
+    "change_log_appointments_ad": "AFTER DELETE ON appointments BEGIN "
+        "INSERT INTO change_log(table_name, row_id, op, changed_at) VALUES ('appointments', old.id, 'D', CURRENT_TIMESTAMP); END",
+    "change_log_clients_ai": "AFTER INSERT ON clients BEGIN "
+        "INSERT INTO change_log(table_name, row_id, op, changed_at) VALUES ('clients', new.id, 'I', CURRENT_TIMESTAMP); END",
+    # last_visit / visit_count cambian con cada turno: solo importan nombre y teléfono
+    "change_log_clients_au": "AFTER UPDATE OF name, phone ON clients BEGIN "
+        "INSERT INTO change_log(table_name, row_id, op, changed_at) VALUES ('clients', new.id, 'U', CURRENT_TIMESTAMP); END",
+    "change_log_clients_ad": "AFTER DELETE ON clients BEGIN "
+        "INSERT INTO change_log(table_name, row_id, op, changed_at) VALUES ('clients', old.id, 'D', CURRENT_TIMESTAMP); END",
+}
+
+
+def _add_missing_columns(conn) -> list[tuple[str, str]]:
+    insp = inspect(conn)
+    added = []
+    for table in Base.metadata.sorted_tables:
+        existing = {c["name"] for c in insp.get_columns(table.name)}
+        for col in table.columns:
+            if col.name in existing:
+                continue
+            col_type = col.type.compile(dialect=conn.dialect)
+            conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN "{col.name}" {col_type}')
+            added.append((table.name, col.name))
+    return added
+
+
+def _backfill(conn, added: list[tuple[str, str]]):
+    if ("clients", "phone_digits") in added:
+        rows = conn.exec_driver_sql("SELECT id, phone FROM clients").fetchall()
+        if rows:
+            conn.exec_driver_sql(
+                "UPDATE clients SET phone_digits = ? WHERE id = ?",
+                [(normalize_ar_phone_to_wa(phone), cid) for cid, phone in rows],
+            )
+
+    if ("clients", "visit_count") in added:
+        rebuild_visits(conn)
+
+
+def rebuild_visits(conn):
+    """
+    Recalcula clients.last_visit / visit_count desde los turnos (activos y
+    archivados). La app los mantiene al guardar; esto es para bases nuevas
+    o cargadas por fuera (ej. `bench.py seed`).
+    """
+    conn.exec_driver_sql("UPDATE clients SET last_visit = NULL, visit_count = 0")
+    conn.exec_driver_sql(
+        """WITH visits AS (
+               SELECT client_id, MAX(date) AS last_visit, COUNT(*) AS visit_count FROM (
+                   SELECT client_id, date FROM appointments WHERE status != 'CANCELADO'
+                   UNION ALL
+                   SELECT client_id, date FROM appointments_archive WHERE status != 'CANCELADO'
+               ) GROUP BY client_id
+           )
+           UPDATE clients SET last_visit = v.last_visit, visit_count = v.visit_count
+           FROM visits v WHERE v.client_id = clients.id"""
+    )
+
+
+# índices que reemplazó otro más completo
+OBSOLETE_INDEXES = [
+    "ix_clients_last_visit",  # -> ix_clients_recent (cubriente)
+]
+
+
+def _ensure_appointments_autoincrement(conn):
+    """
+    `appointments` pasó a AUTOINCREMENT (ver models.Appointment). Las bases
+    viejas se reconstruyen una vez: el contador arranca después del id más
+    alto de appointments y appointments_archive, y los turnos que ya habían
+    reusado el id de uno archivado reciben uno nuevo (con su baja/alta en
+    change_log para /api/sync).
+    """
+    ddl = conn.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'appointments'"
+    ).scalar()
+    if not ddl or "AUTOINCREMENT" in ddl.upper():
+        return
+
+    table = models.Appointment.__table__
+    cols = ", ".join(f'"{c.name}"' for c in table.columns)
+    conn.exec_driver_sql("ALTER TABLE appointments RENAME TO appointments_old")
+    # los índices (y triggers) quedaron en la tabla vieja con los mismos nombres
+    for idx in table.indexes:
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {idx.name}")
+    table.create(conn)
+    conn.exec_driver_sql(f"INSERT INTO appointments ({cols}) SELECT {cols} FROM appointments_old")
+    conn.exec_driver_sql("DROP TABLE appointments_old")
+
+    top = conn.exec_driver_sql(
+        "SELECT MAX(COALESCE((SELECT MAX(id) FROM appointments), 0),"
+        " COALESCE((SELECT MAX(id) FROM appointments_archive), 0))"
+    ).scalar()
+    reused = [r[0] for r in conn.exec_driver_sql(
+        "SELECT a.id FROM appointments a JOIN appointments_archive x ON x.id = a.id ORDER BY a.id"
+    )]
+    for new_id, old_id in enumerate(reused, start=top + 1):
+        conn.exec_driver_sql("UPDATE appointments SET id = ? WHERE id = ?", (new_id, old_id))
+        conn.exec_driver_sql(
+            "INSERT INTO change_log(table_name, row_id, op, changed_at) VALUES"
+            " ('appointments', ?, 'D', CURRENT_TIMESTAMP), ('appointments', ?, 'I', CURRENT_TIMESTAMP)",
+            (old_id, new_id),
+        )
+    conn.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = 'appointments'")
+    conn.exec_driver_sql(
+        "INSERT INTO sqlite_sequence(name, seq) VALUES ('appointments', ?)", (top + len(reused),)
+    )
+
+
+def _create_missing_indexes(conn):
+    for name in OBSOLETE_INDEXES:
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+    for table in Base.metadata.sorted_tables:
+        for idx in table.indexes:
+            idx.create(conn, checkfirst=True)
+
+
+def _ensure_change_log_triggers(conn):
+    existing = {
+        r[0] for r in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+    }
+    for name, body in CHANGE_LOG_TRIGGERS.items():
+        if name not in existing:
+            conn.exec_driver_sql(f"CREATE TRIGGER {name} {body}")
+
+
+def _ensure_client_fts(conn) -> bool:
+    if conn.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'clients_fts'").first():
+        return True
+    try:
+        with conn.begin_nested():
+            for ddl in CLIENT_FTS_DDL:
+                conn.exec_driver_sql(ddl)
+    except OperationalError:
+        # SQLite compilado sin FTS5 / tokenizer trigram (< 3.34)
+        return False
+    return True
+
+
+def migrate(bind=engine):
+    global CLIENT_FTS
+    had_rollups = inspect(bind).has_table("daily_rollups")
+    Base.metadata.create_all(bind=bind)
+    with bind.begin() as conn:
+        added = _add_missing_columns(conn)
+        _backfill(conn, added)
+        _ensure_appointments_autoincrement(conn)
+        if not had_rollups:
+            # tabla nueva en una base con historia: se arma una sola vez
+            reports.rebuild_rollups(conn)
+        _create_missing_indexes(conn)
+        CLIENT_FTS = _ensure_client_fts(conn)
+        _ensure_change_log_triggers(conn)
+        conn.exec_driver_sql("PRAGMA optimize")
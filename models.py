@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Date, Time, Boolean, ForeignKey, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Date, DateTime, Time, Boolean, ForeignKey, Text, Index
+from sqlalchemy.orm import relationship, validates
 from db import Base
+from phones import normalize_ar_phone_to_wa
 
 
 class Specialty(Base):
@@ -22,20 +23,43 @@ class Staff(Base):
 
 class Client(Base):
     __tablename__ = "clients"
+    __table_args__ = (
+        # /clientes/inactivos y orden "reciente": rango + orden por last_visit
+        # leyendo todo del índice (COVERING), sin ir a la tabla por cada fila
+        Index("ix_clients_recent", "last_visit", "id", "name", "phone", "visit_count"),
+    )
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(180), nullable=False)
+    name = Column(String(180), nullable=False, index=True)
     phone = Column(String(40), default="")
+    # teléfono normalizado (solo dígitos, formato WhatsApp): búsqueda por teléfono
+    phone_digits = Column(String(40), default="", index=True)
     email = Column(String(180), default="")
     notes = Column(Text, default="")
 
-    # ✅ última visita (se actualiza cuando guardás un turno)
+    # ✅ última visita y cantidad de turnos activos (se actualizan cuando
+    # guardás / editás / cancelás un turno)
     last_visit = Column(Date, nullable=True)
+    visit_count = Column(Integer, default=0)
 
     appointments = relationship("Appointment", back_populates="client")
 
+    @validates("phone")
+    def _sync_phone_digits(self, key, value):
+        self.phone_digits = normalize_ar_phone_to_wa(value)
+        return value
+
 
 class Appointment(Base):
     __tablename__ = "appointments"
+    __table_args__ = (
+        # vista del día + assert_no_overlap (cubre start_time/duración sin ir a la tabla)
+        Index("ix_appointments_day", "date", "salon", "staff_id", "status", "start_time", "duration_min"),
+        # ficha del cliente: ordena por fecha sin B-tree temporal y corta en el primero
+        Index("ix_appointments_client", "client_id", "date", "start_time", "status"),
+        # AUTOINCREMENT: archive.py mueve turnos con su id a appointments_archive;
+        # sin esto SQLite reusa el id más alto después de archivarlo
+        {"sqlite_autoincrement": True},
+    )
     id = Column(Integer, primary_key=True, index=True)
 
     date = Column(Date, nullable=False)
@@ -57,8 +81,87 @@ class Appointment(Base):
 
     # WhatsApp
     wa_sent = Column(Boolean, default=False)
+    archived = False  # ver AppointmentArchive
 
     # ✅ relaciones prolijas
     client = relationship("Client", back_populates="appointments")
     specialty = relationship("Specialty", back_populates="appointments")
     staff = relationship("Staff", back_populates="appointments")
+
+
+class AppointmentArchive(Base):
+    """
+    Turnos viejos y cancelados, movidos fuera de `appointments` por
+    archive.py (mismas columnas y mismo id). Solo lectura: historial del
+    cliente, exportaciones, reportes y días ya archivados.
+    """
+    __tablename__ = "appointments_archive"
+    __table_args__ = (
+        Index("ix_appointments_archive_client", "client_id", "date", "start_time", "status"),
+        Index("ix_appointments_archive_day", "date", "salon", "staff_id", "status"),
+    )
+    id = Column(Integer, primary_key=True)
+
+    date = Column(Date, nullable=False)
+    start_time = Column(Time, nullable=False)
+    duration_min = Column(Integer, default=30)
+
+    client_id = Column(Integer, ForeignKey("clients.id"), nullable=False)
+    specialty_id = Column(Integer, ForeignKey("specialties.id"), nullable=True)
+    staff_id = Column(Integer, ForeignKey("staff.id"), nullable=True)
+    salon = Column(Integer, default=1)
+
+    deposit_paid = Column(Boolean, default=False)
+    deposit_amount = Column(Integer, default=0)
+
+    notes = Column(Text, default="")
+    status = Column(String(30), default="ACTIVO")
+    wa_sent = Column(Boolean, default=False)
+
+    archived_at = Column(DateTime, nullable=True)
+    archived = True  # los templates no linkean a editar
+
+    client = relationship("Client", viewonly=True)
+    specialty = relationship("Specialty", viewonly=True)
+    staff = relationship("Staff", viewonly=True)
+
+
+class ChangeLog(Base):
+    """
+    Un registro por alta / cambio / baja de turnos y clientes (lo llenan
+    triggers, ver migrations.py). /api/sync devuelve lo cambiado desde un id.
+    op: "I" / "U" / "D".
+    """
+    __tablename__ = "change_log"
+    # AUTOINCREMENT: los ids no se reusan aunque se pode la tabla
+    __table_args__ = {"sqlite_autoincrement": True}
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    table_name = Column(String(30), nullable=False)
+    row_id = Column(Integer, nullable=False)
+    op = Column(String(1), nullable=False)
+    changed_at = Column(DateTime, nullable=True)
+
+
+class DailyRollup(Base):
+    """
+    Totales por día / staff / especialidad / salón para los reportes.
+    Se actualiza junto con cada alta, edición y cancelación (ver reports.py);
+    staff_id / specialty_id = 0 cuando el turno no tiene.
+    """
+    __tablename__ = "daily_rollups"
+    date = Column(Date, primary_key=True)
+    staff_id = Column(Integer, primary_key=True, default=0)
+    specialty_id = Column(Integer, primary_key=True, default=0)
+    salon = Column(Integer, primary_key=True, default=1)
+
+    booked_min = Column(Integer, nullable=False, default=0)
+    booked_count = Column(Integer, nullable=False, default=0)
+    cancelled_count = Column(Integer, nullable=False, default=0)
+    deposits = Column(Integer, nullable=False, default=0)
+
+
+class AppMeta(Base):
+    """Contadores de versión compartidos entre workers (ej. "refdata")."""
+    __tablename__ = "app_meta"
+    key = Column(String(60), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,25 @@
+def _digits(s: str) -> str:
+    return "".join(ch for ch in (s or "") if ch.isdigit())
+
+def normalize_ar_phone_to_wa(phone_raw: str) -> str:
+    """
+    Entrada típica: 11xxxxxxxx (sin +54 9).
+    Salida WhatsApp: 54911xxxxxxxx
+    """
+    p = _digits(phone_raw)
+
+    if p.startswith("549") and len(p) >= 12:
+        return p
+
+    if p.startswith("54") and len(p) >= 11:
+        if p.startswith("549"):
+            return p
+        # 54 + 11xxxx -> 54911xxxx
+        if len(p) >= 12 and p[2:4] == "11":
+            return "549" + p[2:]
+        return p
+
+    if p.startswith("11") and len(p) >= 10:
+        return "549" + p
+
+    return p
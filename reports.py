@@ -0,0 +1,182 @@
+"""
+Reportes mensuales (minutos reservados y ocupación por staff, señas,
+cancelaciones por especialidad) leídos solo de `daily_rollups`.
+
+    python reports.py rebuild
+
+Los handlers de turnos llaman a `apply_rollups` con el estado anterior y el
+nuevo de cada turno que tocan; `rebuild` recalcula la tabla entera desde
+`appointments` y `appointments_archive` (por ejemplo después de editar la
+base a mano).
+"""
+import sys
+from datetime import date
+
+from sqlalchemy import case, delete, func, insert, select, union_all
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from db import engine
+from models import Appointment, AppointmentArchive, DailyRollup
+
+KEY = ("date", "staff_id", "specialty_id", "salon")
+TOTALS = ("booked_min", "booked_count", "cancelled_count", "deposits")
+
+
+def appt_values(a: Appointment) -> dict:
+    """Lo que importa de un turno para los rollups (foto antes/después de un cambio)."""
+    return {
+        "date": a.date,
+        "staff_id": a.staff_id,
+        "specialty_id": a.specialty_id,
+        "salon": a.salon,
+        "duration_min": a.duration_min,
+        "status": a.status,
+        "deposit_paid": a.deposit_paid,
+        "deposit_amount": a.deposit_amount,
+    }
+
+
+def _key(v: dict) -> tuple:
+    return (v["date"], v.get("staff_id") or 0, v.get("specialty_id") or 0, v.get("salon") or 1)
+
+
+def _contribution(v: dict) -> tuple[int, int, int, int]:
+    if (v.get("status") or "ACTIVO") == "CANCELADO":
+        return (0, 0, 1, 0)
+    deposit = int(v.get("deposit_amount") or 0) if v.get("deposit_paid") else 0
+    return (int(v.get("duration_min") or 0), 1, 0, deposit)
+
+
+def rollup_deltas(removed=(), added=()) -> list[dict]:
+    deltas = {}
+    for items, sign in ((removed, -1), (added, 1)):
+        for v in items:
+            acc = deltas.setdefault(_key(v), [0, 0, 0, 0])
+            for i, n in enumerate(_contribution(v)):
+                acc[i] += sign * n
+    return [
+        {**dict(zip(KEY, key)), **dict(zip(TOTALS, acc))}
+        for key, acc in deltas.items() if any(acc)
+    ]
+
+
+_upsert = sqlite_insert(DailyRollup)
+ROLLUP_UPSERT = _upsert.on_conflict_do_update(
+    index_elements=list(KEY),
+    set_={name: getattr(DailyRollup, name) + getattr(_upsert.excluded, name) for name in TOTALS},
+)
+
+
+def apply_rollups(db: Session, removed=(), added=()):
+    """Suma `added` y resta `removed` (dicts de `appt_values`) en la misma transacción."""
+    params = rollup_deltas(removed, added)
+    if params:
+        db.execute(ROLLUP_UPSERT, params)
+
+
+def rebuild_rollups(conn):
+    # turnos activos + archivados (archive.py solo los mueve, siguen contando)
+    fields = ("date", "staff_id", "specialty_id", "salon", "duration_min", "status", "deposit_paid", "deposit_amount")
+    a = union_all(*(
+        select(*(getattr(model, f) for f in fields)) for model in (Appointment, AppointmentArchive)
+    )).subquery()
+
+    active = a.c.status != "CANCELADO"
+    keys = (
+        a.c.date,
+        func.coalesce(a.c.staff_id, 0),
+        func.coalesce(a.c.specialty_id, 0),
+        func.coalesce(a.c.salon, 1),
+    )
+    conn.execute(delete(DailyRollup))
+    conn.execute(insert(DailyRollup).from_select(
+        list(KEY) + list(TOTALS),
+        select(
+            *keys,
+            func.sum(case((active, func.coalesce(a.c.duration_min, 0)), else_=0)),
+            func.sum(case((active, 1), else_=0)),
+            func.sum(case((active, 0), else_=1)),
+            func.sum(case((active & a.c.deposit_paid, func.coalesce(a.c.deposit_amount, 0)), else_=0)),
+        ).group_by(*keys),
+    ))
+
+
+def monthly_report(db: Session, first: date, next_first: date, day_minutes: int, salon: int = 0) -> dict:
+    """
+    Totales del rango [first, next_first). La ocupación de cada staff es
+    minutos reservados / (días con turnos × minutos de la grilla del día).
+    """
+    in_range = [DailyRollup.date >= first, DailyRollup.date < next_first]
+    if salon:
+        in_range.append(DailyRollup.salon == salon)
+
+    def totals(*group):
+        return db.query(
+            *group,
+            func.sum(DailyRollup.booked_min),
+            func.sum(DailyRollup.booked_count),
+            func.sum(DailyRollup.cancelled_count),
+            func.sum(DailyRollup.deposits),
+        ).filter(*in_range)
+
+    staff = []
+    for st_id, minutes, count, cancelled, deposits, days in totals(
+        DailyRollup.staff_id
+    ).add_columns(
+        func.count(func.distinct(case((DailyRollup.booked_count > 0, DailyRollup.date))))
+    ).group_by(DailyRollup.staff_id):
+        capacity = (days or 0) * day_minutes
+        staff.append({
+            "staff_id": st_id,
+            "booked_min": int(minutes or 0),
+            "booked": int(count or 0),
+            "cancelled": int(cancelled or 0),
+            "deposits": int(deposits or 0),
+            "days": int(days or 0),
+            "occupancy_pct": (round(100.0 * (minutes or 0) / capacity, 1) if capacity else 0.0),
+        })
+
+    specialties = [{
+        "specialty_id": sp_id,
+        "booked_min": int(minutes or 0),
+        "booked": int(count or 0),
+        "cancelled": int(cancelled or 0),
+        "cancelled_pct": (round(100.0 * cancelled / (count + cancelled), 1) if (count or cancelled) else 0.0),
+        "deposits": int(deposits or 0),
+    } for sp_id, minutes, count, cancelled, deposits in totals(DailyRollup.specialty_id).group_by(DailyRollup.specialty_id)]
+
+    days = [{
+        "date": d.strftime("%Y-%m-%d"),
+        "booked_min": int(minutes or 0),
+        "booked": int(count or 0),
+        "cancelled": int(cancelled or 0),
+        "deposits": int(deposits or 0),
+    } for d, minutes, count, cancelled, deposits in totals(DailyRollup.date).group_by(DailyRollup.date).order_by(DailyRollup.date)]
+
+    return {
+        "booked_min": sum(s["booked_min"] for s in staff),
+        "booked": sum(s["booked"] for s in staff),
+        "cancelled": sum(s["cancelled"] for s in staff),
+        "deposits": sum(s["deposits"] for s in staff),
+        "staff": staff,
+        "specialties": specialties,
+        "days": days,
+    }
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv != ["rebuild"]:
+        raise SystemExit("uso: python reports.py rebuild")
+
+    import migrations
+    migrations.migrate(engine)
+    with engine.begin() as conn:
+        rebuild_rollups(conn)
+        n = conn.execute(select(func.count()).select_from(DailyRollup)).scalar()
+    print(f"daily_rollups: {n} filas")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,34 @@
+"""
+Los módulos de la app son planos (db.py, app.py...) y `db.py` arma el engine
+al importarse, así que antes de importar nada se apunta DATABASE_URL a un
+archivo temporal y se corre desde la raíz del repo (templates/, static/).
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test.db")
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+import migrations
+
+
+@pytest.fixture
+def sqlite_file(tmp_path):
+    """Engine sobre un SQLite nuevo en tmp_path, con `migrations.migrate` aplicado."""
+    eng = create_engine(f"sqlite:///{tmp_path / 'angies_color.db'}")
+    migrations.migrate(eng)
+    yield eng
+    eng.dispose()
+
+
+@pytest.fixture
+def session(sqlite_file):
+    with Session(sqlite_file) as db:
+        yield db
@@ -0,0 +1,150 @@
+"""archive.py: mover turnos a appointments_archive sin chocar ids."""
+from datetime import date, time, timedelta
+
+from sqlalchemy import create_engine, insert, select, update
+
+import archive
+import migrations
+from models import Appointment, AppointmentArchive, Client
+
+DAY = date.today() + timedelta(days=10)
+
+
+def book(conn, hour: int) -> int:
+    return conn.execute(insert(Appointment).values(
+        date=DAY, start_time=time(hour, 0), duration_min=30, client_id=1, salon=1, status="ACTIVO",
+    ).returning(Appointment.id)).scalar()
+
+
+def cancel(conn, appt_id: int):
+    conn.execute(update(Appointment).where(Appointment.id == appt_id).values(status="CANCELADO"))
+
+
+def archived_ids(conn) -> list[int]:
+    return sorted(conn.execute(select(AppointmentArchive.id)).scalars())
+
+
+def test_archiving_twice_does_not_reuse_ids(sqlite_file):
+    with sqlite_file.begin() as conn:
+        conn.execute(insert(Client).values(id=1, name="Ana", phone=""))
+        book(conn, 9)
+        second = book(conn, 10)
+        cancel(conn, second)
+
+    assert archive.archive_appointments(sqlite_file).moved == 1
+
+    # el turno más nuevo se archivó: el próximo no puede recibir su id
+    with sqlite_file.begin() as conn:
+        third = book(conn, 11)
+        assert third > second
+        cancel(conn, third)
+
+    assert archive.archive_appointments(sqlite_file).moved == 1
+    with sqlite_file.connect() as conn:
+        assert archived_ids(conn) == [second, third]
+        assert conn.execute(select(Appointment.id)).scalars().all() == [1]
+
+
+def test_migrate_rebuilds_legacy_appointments_table(tmp_path):
+    eng = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    migrations.migrate(eng)
+
+    # base de antes de AUTOINCREMENT, que ya reusó el id 2 después de archivarlo
+    with eng.begin() as conn:
+        ddl = conn.exec_driver_sql("SELECT sql FROM sqlite_master WHERE name = 'appointments'").scalar()
+        conn.exec_driver_sql("DROP TABLE appointments")
+        conn.exec_driver_sql(ddl.replace("AUTOINCREMENT", ""))
+        conn.execute(insert(Client).values(id=1, name="Ana", phone=""))
+        book(conn, 9)
+        cancel(conn, book(conn, 10))
+    archive.archive_appointments(eng)
+    with eng.begin() as conn:
+        assert book(conn, 12) == 2
+
+    migrations.migrate(eng)
+
+    with eng.begin() as conn:
+        ddl = conn.exec_driver_sql("SELECT sql FROM sqlite_master WHERE name = 'appointments'").scalar()
+        assert "AUTOINCREMENT" in ddl.upper()
+        assert conn.execute(select(Appointment.id)).scalars().all() == [1, 3]
+        assert conn.execute(select(Appointment.start_time).where(Appointment.id == 3)).scalar() == time(12, 0)
+        indexes = {r[0] for r in conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'appointments'"
+        )}
+        assert {"ix_appointments_day", "ix_appointments_client"} <= indexes
+        assert conn.exec_driver_sql(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'appointments'"
+        ).scalar() == 3
+        # el dispositivo saca el id viejo y baja el nuevo
+        assert conn.exec_driver_sql(
+            "SELECT row_id, op FROM change_log ORDER BY id DESC LIMIT 2"
+        ).all() == [(3, "I"), (2, "D")]
+
+        cancel(conn, 3)
+        assert book(conn, 13) == 4
+
+    assert archive.archive_appointments(eng).moved == 1
+    with eng.connect() as conn:
+        assert archived_ids(conn) == [2, 3]
+    eng.dispose()
+
+
+# ---------------- vistas sobre días archivados (app, base global) ----------------
+OLD_MONTH = date(2020, 2, 1)
+
+
+def test_calendar_and_day_views_read_the_archive():
+    from fastapi.testclient import TestClient
+
+    import app
+    from db import SessionLocal, engine
+    from models import Staff
+
+    with SessionLocal() as db:
+        staff, cl = Staff(name="Archivo staff"), Client(name="Archivo cliente", phone="")
+        db.add_all([staff, cl])
+        db.flush()
+        d1, d2 = OLD_MONTH + timedelta(days=9), OLD_MONTH + timedelta(days=10)
+        db.add_all([
+            Appointment(date=d, start_time=time(h, 0), duration_min=dur, client_id=cl.id,
+                        staff_id=staff.id, salon=1, status=status)
+            for d, h, dur, status in [
+                (d1, 9, 60, "ACTIVO"), (d1, 11, 30, "ACTIVO"), (d1, 14, 90, "CANCELADO"), (d2, 10, 45, "ACTIVO"),
+            ]
+        ])
+        db.commit()
+        staff_id, client_id = staff.id, cl.id
+
+    client = TestClient(app.app)
+    url = f"/api/calendario?mes={OLD_MONTH:%Y-%m}&staff_id={staff_id}"
+    before = client.get(url)
+    assert before.json()["days"] == {
+        d1.isoformat(): {"count": 2, "staff_minutes": {str(staff_id): 90}},
+        d2.isoformat(): {"count": 1, "staff_minutes": {str(staff_id): 45}},
+    }
+
+    assert archive.archive_appointments(engine).moved >= 4
+    with engine.connect() as conn:
+        assert not conn.execute(select(Appointment.id).where(Appointment.client_id == client_id)).all()
+
+    after = client.get(url)
+    assert after.json() == before.json()
+    assert after.headers["etag"] == before.headers["etag"]
+
+    # un turno nuevo en un día ya archivado se suma al del archivo
+    with engine.begin() as conn:
+        conn.execute(insert(Appointment).values(
+            date=d1, start_time=time(16, 0), duration_min=30, client_id=client_id,
+            staff_id=staff_id, salon=1, status="ACTIVO",
+        ))
+    assert client.get(url).json()["days"][d1.isoformat()] == {"count": 3, "staff_minutes": {str(staff_id): 120}}
+
+    # vista del día / semana: los archivados se muestran pero no linkean a editar
+    with engine.connect() as conn:
+        archived = conn.execute(select(AppointmentArchive.id).where(AppointmentArchive.client_id == client_id)).scalars().all()
+        live_id = conn.execute(select(Appointment.id).where(Appointment.client_id == client_id)).scalar()
+    for page in (f"/turnos?date_str={d1}&staff_id={staff_id}&salon=1", f"/turnos/semana?desde={d1}&dias=2"):
+        html = client.get(page).text
+        assert html.count("Archivo cliente") >= 3, page
+        assert f"/turnos/{live_id}/editar" in html, page
+        assert not any(f"/turnos/{i}/editar" in html for i in archived), page
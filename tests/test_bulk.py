@@ -0,0 +1,66 @@
+"""Turnos recurrentes (POST /turnos/nuevo) y alta en lote (/api/turnos/lote)."""
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+from db import SessionLocal
+from models import Appointment, Client, Staff
+
+FIRST = date(2033, 6, 7)
+
+
+@pytest.fixture(scope="module")
+def client():
+    with SessionLocal() as db:
+        staff, cl = Staff(name="Lote staff"), Client(name="Lote cliente", phone="")
+        db.add_all([staff, cl])
+        db.commit()
+        ids = (staff.id, cl.id)
+    with TestClient(app.app) as c:
+        c.staff_id, c.client_id = ids
+        yield c
+
+
+def book(client, d: date, **extra):
+    return client.post("/turnos/nuevo", data={
+        "date_str": d.isoformat(), "time_str": "10:00", "client_id": client.client_id,
+        "staff_id": client.staff_id, "duration_min": 60, **extra,
+    }, follow_redirects=False)
+
+
+def test_recurring_deposit_goes_to_first_accepted_date(client):
+    assert book(client, FIRST).status_code == 303  # la primera fecha ya está tomada
+
+    r = book(client, FIRST, repeat_weeks=3, repeat_count=3, deposit_paid="1", deposit_amount=15000)
+    assert r.status_code == 303
+    assert f"omitidos={FIRST.isoformat()}" in r.headers["location"]
+
+    with SessionLocal() as db:
+        rows = db.query(Appointment.date, Appointment.deposit_paid, Appointment.deposit_amount).filter(
+            Appointment.client_id == client.client_id,
+            Appointment.date > FIRST,
+        ).order_by(Appointment.date).all()
+    assert rows == [
+        (FIRST + timedelta(weeks=3), True, 15000),
+        (FIRST + timedelta(weeks=6), False, 0),
+    ]
+
+
+@pytest.mark.parametrize("occurrence, default", [
+    ({"duration_min": 0}, 30),
+    ({"duration_min": -30}, 30),
+    ({}, 0),
+])
+def test_bulk_rejects_non_positive_duration(client, occurrence, default):
+    r = client.post("/api/turnos/lote", json={
+        "client_id": client.client_id, "staff_id": client.staff_id, "duration_min": default,
+        "occurrences": [{"date": "2033-07-01", "time": "11:00", **occurrence}],
+    })
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Duración inválida"
+    assert book(client, date(2033, 7, 1), duration_min=0).status_code == 400
+
+    with SessionLocal() as db:
+        assert not db.query(Appointment.id).filter(Appointment.date == date(2033, 7, 1)).count()
@@ -0,0 +1,137 @@
+"""
+Altas y lecturas en paralelo (hilos) contra un SQLite en archivo, con cada
+perfil de db.py: no tiene que aparecer "database is locked" ni quedar dos
+turnos solapados en el mismo staff / salón.
+
+`db.py` arma el engine al importarse, así que cada perfil corre en un
+proceso aparte (este mismo archivo, ver `hammer`).
+"""
+import os
+import random
+import subprocess
+import sys
+import threading
+from datetime import date, time, timedelta
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DAYS = [date(2032, 5, 3) + timedelta(days=i) for i in range(3)]
+TIMES = [time(h, m) for h in range(9, 13) for m in (0, 30)]
+WRITERS = 8
+READERS = 4
+
+
+@pytest.mark.parametrize("profile", ["default", "wal"])
+def test_parallel_create_and_read(profile, tmp_path):
+    env = {
+        **os.environ,
+        "DB_PROFILE": profile,
+        "DATABASE_URL": f"sqlite:///{tmp_path / 'angies_color.db'}",
+    }
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__)],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=600,
+    )
+    output = proc.stdout + proc.stderr
+    assert "database is locked" not in output, output
+    assert proc.returncode == 0, output
+
+
+def hammer():
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    from fastapi.testclient import TestClient
+    from sqlalchemy import text
+
+    import app
+    import db
+
+    with db.SessionLocal() as s:
+        staff_ids = []
+        for name in ("Ana", "Bea"):
+            staff_ids.append(s.execute(text("INSERT INTO staff(name) VALUES (:n) RETURNING id"), {"n": name}).scalar())
+        client_id = s.execute(text("INSERT INTO clients(name, phone) VALUES ('Lote', '') RETURNING id")).scalar()
+        s.commit()
+
+    # todos compiten por los mismos horarios: la mayoría tiene que rebotar
+    slots = [(d, t, st) for d in DAYS for t in TIMES for st in staff_ids]
+    errors = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def record(kind, code):
+        with lock:
+            statuses[(kind, code)] = statuses.get((kind, code), 0) + 1
+
+    def writer(n, c):
+        rnd = random.Random(n)
+        mine = slots[:]
+        rnd.shuffle(mine)
+        for i, (d, t, st) in enumerate(mine):
+            try:
+                if i % 2:
+                    # alta por formulario (ruta async)
+                    r = c.post("/turnos/nuevo", data={
+                        "date_str": d.isoformat(), "time_str": t.strftime("%H:%M"),
+                        "new_name": f"w{n}-{i}", "staff_id": st, "duration_min": 60,
+                    }, follow_redirects=False)
+                    ok = r.status_code in (303, 400)
+                else:
+                    # alta por API en lote (ruta sync, threadpool)
+                    r = c.post("/api/turnos/lote", json={
+                        "client_id": client_id, "staff_id": st, "duration_min": 60,
+                        "occurrences": [{"date": d.isoformat(), "time": t.strftime("%H:%M")}],
+                    })
+                    ok = r.status_code == 200
+                record("write", r.status_code)
+                if not ok:
+                    errors.append(f"{r.status_code} {r.text[:200]}")
+            except Exception as e:  # noqa: BLE001
+                errors.append(repr(e))
+
+    def reader(n, c):
+        for i in range(60):
+            d = DAYS[i % len(DAYS)]
+            try:
+                r = c.get(f"/turnos?date_str={d.isoformat()}&staff_id={staff_ids[n % 2]}")
+                record("read", r.status_code)
+                if r.status_code != 200:
+                    errors.append(f"{r.status_code} {r.text[:200]}")
+            except Exception as e:  # noqa: BLE001
+                errors.append(repr(e))
+
+    with TestClient(app.app) as c:
+        threads = [threading.Thread(target=writer, args=(n, c)) for n in range(WRITERS)]
+        threads += [threading.Thread(target=reader, args=(n, c)) for n in range(READERS)]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+
+    with db.SessionLocal() as s:
+        rows = s.execute(text(
+            "SELECT date, staff_id, start_time, duration_min FROM appointments "
+            "WHERE status != 'CANCELADO' ORDER BY date, staff_id, start_time"
+        )).all()
+
+    overlaps = []
+    prev = {}
+    for d, st, start, dur in rows:
+        h, m = map(int, start.split(":")[:2])
+        begin = h * 60 + m
+        key = (d, st)
+        if key in prev and prev[key][1] > begin:
+            overlaps.append((d, st, prev[key][0], start))
+        if key not in prev or begin + dur > prev[key][1]:
+            prev[key] = (start, begin + dur)
+
+    print(f"perfil {db.DB_PROFILE}: {len(rows)} turnos, respuestas {statuses}")
+    assert not errors, errors[:5]
+    assert not overlaps, overlaps[:5]
+    assert rows, "no se creó ningún turno"
+
+
+if __name__ == "__main__":
+    hammer()
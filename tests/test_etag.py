@@ -0,0 +1,100 @@
+"""
+/turnos responde 304 con If-None-Match mientras no cambie nada de lo que
+muestra: cada escritura que lo afecta tiene que invalidar el ETag.
+"""
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+from db import SessionLocal
+from models import Appointment, Client, Specialty, Staff
+
+DAY = date(2037, 5, 4)
+OTHER_DAY = date(2037, 5, 5)
+
+
+@pytest.fixture(scope="module")
+def client():
+    with SessionLocal() as db:
+        staff, cl = Staff(name="Etag staff"), Client(name="Etag cliente", phone="11 5555-0000")
+        db.add_all([staff, cl])
+        db.commit()
+        ids = (staff.id, cl.id)
+    with TestClient(app.app) as c:
+        c.staff_id, c.client_id = ids
+        yield c
+
+
+def day_url(client, d: date = DAY) -> str:
+    return f"/turnos?date_str={d.isoformat()}&staff_id={client.staff_id}&salon=1"
+
+
+def stale_after(client, write, days=(DAY,)):
+    urls = [day_url(client, d) for d in days]
+    etags = [client.get(url).headers["etag"] for url in urls]
+    for url, etag in zip(urls, etags):
+        assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    write()
+
+    for url, etag in zip(urls, etags):
+        r = client.get(url, headers={"If-None-Match": etag})
+        assert r.status_code == 200, url
+        assert r.headers["etag"] != etag
+
+
+def appt_ids(d: date = DAY) -> list[int]:
+    with SessionLocal() as db:
+        return [r.id for r in db.query(Appointment.id).filter(Appointment.date == d).order_by(Appointment.start_time)]
+
+
+def ok(r, status=303):
+    assert r.status_code == status, r.text
+    return r
+
+
+def test_booking_writes_invalidate_the_day(client):
+    stale_after(client, lambda: ok(client.post("/turnos/nuevo", data={
+        "date_str": DAY.isoformat(), "time_str": "10:00", "client_id": client.client_id,
+        "staff_id": client.staff_id, "duration_min": 60,
+    }, follow_redirects=False)))
+
+    stale_after(client, lambda: ok(client.post("/api/turnos/lote", json={
+        "client_id": client.client_id, "staff_id": client.staff_id, "duration_min": 30,
+        "occurrences": [{"date": DAY.isoformat(), "time": "12:00"}, {"date": DAY.isoformat(), "time": "14:00"}],
+    }), 200))
+
+    # mover un turno a otro día cambia los dos días
+    moved = appt_ids()[-1]
+    stale_after(client, lambda: ok(client.post(f"/turnos/{moved}/editar", data={
+        "date_str": OTHER_DAY.isoformat(), "time_str": "09:00", "client_id": client.client_id,
+        "duration_min": 30, "staff_id": client.staff_id, "salon_id": 1,
+    }, follow_redirects=False)), days=(DAY, OTHER_DAY))
+
+    first, second = appt_ids()
+    stale_after(client, lambda: ok(client.post(f"/turnos/{second}/cancelar", follow_redirects=False)))
+    stale_after(client, lambda: ok(client.post(f"/turnos/{first}/wa_sent"), 200))
+    stale_after(client, lambda: ok(client.post("/api/wa/enviados", json={"ids": [second, moved]}), 200),
+                days=(DAY, OTHER_DAY))
+
+
+def test_client_edit_invalidates_the_day(client):
+    stale_after(client, lambda: ok(client.post(f"/clientes/{client.client_id}/editar", data={
+        "name": "Etag cliente renombrada", "phone": "11 5555-0001",
+    }, follow_redirects=False)))
+    assert "Etag cliente renombrada" in client.get(day_url(client)).text
+
+
+def test_refdata_writes_invalidate_the_day(client):
+    stale_after(client, lambda: ok(client.post("/admin/staff/nuevo", data={"name": "Etag otra"}, follow_redirects=False)))
+    stale_after(client, lambda: ok(client.post("/admin/especialidades/nueva", data={"name": "Etag servicio"},
+                                               follow_redirects=False)))
+
+    with SessionLocal() as db:
+        staff_id = db.query(Staff.id).filter(Staff.name == "ETAG OTRA").scalar()
+        specialty_id = db.query(Specialty.id).filter(Specialty.name == "ETAG SERVICIO").scalar()
+    stale_after(client, lambda: ok(client.post(f"/admin/staff/{staff_id}/eliminar", follow_redirects=False)))
+    stale_after(client, lambda: ok(client.post(f"/admin/especialidades/{specialty_id}/eliminar",
+                                               follow_redirects=False)))
@@ -0,0 +1,81 @@
+"""Importación de clientes desde CSV (importer.py)."""
+import pytest
+from sqlalchemy import select
+
+import importer
+from models import Client
+
+
+def rows_of(data: bytes) -> list[dict]:
+    return list(importer.read_rows(importer.decode_csv(data)))
+
+
+def clients(engine) -> list[tuple]:
+    with engine.connect() as conn:
+        return [tuple(r) for r in conn.execute(
+            select(Client.name, Client.phone_digits, Client.email, Client.notes).order_by(Client.id)
+        )]
+
+
+def test_header_aliases_in_any_order():
+    rows = rows_of("Teléfono,E-mail,NOMBRE Y APELLIDO,Observaciones\n11 5555-1234,ana@x.com,Ana,vip\n".encode())
+    assert rows == [{"phone": "11 5555-1234", "email": "ana@x.com", "name": "Ana", "notes": "vip"}]
+
+
+def test_headerless_file_uses_fixed_order_and_keeps_first_row():
+    rows = rows_of(b"Ana,11 5555-1234,ana@x.com\nBea,11 4444-0000\n")
+    assert [r["name"] for r in rows] == ["Ana", "Bea"]
+    assert rows[0] == {"name": "Ana", "phone": "11 5555-1234", "email": "ana@x.com", "notes": ""}
+    assert rows[1]["email"] == ""
+
+
+def test_semicolon_and_cp1252_from_excel():
+    data = "Nombre;Teléfono;Notas\r\nMaría Peña;11 5555-1234;tinte, sin amoníaco\r\n".encode("cp1252")
+    with pytest.raises(UnicodeDecodeError):
+        data.decode("utf-8")
+    assert rows_of(data) == [{"name": "María Peña", "phone": "11 5555-1234", "notes": "tinte, sin amoníaco"}]
+
+
+def test_utf8_bom_is_dropped():
+    rows = rows_of("\ufeffnombre,telefono\nAna,1155551234\n".encode())
+    assert rows == [{"name": "Ana", "phone": "1155551234"}]
+
+
+@pytest.mark.parametrize("batch_size", [1000, 2])
+def test_counts_dedupe_by_phone_and_by_name(session, sqlite_file, batch_size):
+    session.add_all([
+        Client(name="Existente", phone="11 4444-0000"),
+        Client(name="Sin Tel", phone=""),
+    ])
+    session.commit()
+
+    rows = [
+        {"name": "Ana", "phone": "11 5555-1234", "email": ""},
+        {"name": "Ana P.", "phone": "+54 9 11 5555 1234", "email": "ana@x.com"},  # misma, fusiona email
+        {"name": "Ana", "phone": "1155551234", "email": "otro@x.com"},  # ya tiene email: omite
+        {"name": "Existente bis", "phone": "(11) 4444-0000", "notes": "rubia"},  # fusiona contra la base
+        {"name": "  sin   tel ", "phone": "", "email": "st@x.com"},  # por nombre contra la base
+        {"name": "Dana Gómez", "phone": ""},
+        {"name": "DANA GOMEZ", "phone": "", "notes": "nueva nota"},  # por nombre en el archivo
+        {"name": "Dana Gomez", "phone": ""},  # sin datos nuevos
+        {"name": "", "phone": "11 3333-0000"},  # sin nombre
+    ]
+    result = importer.import_clients(rows, sqlite_file, batch_size=batch_size)
+
+    assert (result.created, result.merged, result.skipped) == (2, 4, 3)
+    assert clients(sqlite_file) == [
+        ("Existente", "5491144440000", "", "rubia"),
+        ("Sin Tel", "", "st@x.com", ""),
+        ("Ana", "5491155551234", "ana@x.com", ""),
+        ("Dana Gómez", "", "", "nueva nota"),
+    ]
+
+
+def test_reimporting_the_same_file_creates_nothing(sqlite_file):
+    data = "nombre;telefono;email\nAna;11 5555-1234;a@x.com\nBea;;b@x.com\nBéa;;\n".encode("cp1252")
+    first = importer.import_clients(rows_of(data), sqlite_file)
+    assert (first.created, first.merged, first.skipped) == (2, 0, 1)
+
+    again = importer.import_clients(rows_of(data), sqlite_file, batch_size=1)
+    assert (again.created, again.merged, again.skipped) == (0, 0, 3)
+    assert len(clients(sqlite_file)) == 2
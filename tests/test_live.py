@@ -0,0 +1,117 @@
+"""Actualizaciones en vivo: live.Broker y el parcial /turnos/slots."""
+import asyncio
+import re
+import threading
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+import live
+from db import SessionLocal
+from models import Appointment, Client, Staff
+
+DAY = date(2038, 8, 9)
+
+
+def drain(sub) -> list:
+    items = []
+    while not sub.queue.empty():
+        items.append(sub.queue.get_nowait())
+    return items
+
+
+# ---------------- Broker ----------------
+def test_overflow_leaves_a_single_resync():
+    async def main():
+        broker = live.Broker()
+        slow, fast = broker.subscribe("c"), broker.subscribe("c")
+        for i in range(live.QUEUE_SIZE):
+            broker.publish("c", {"type": "slots", "n": i})
+        assert len(drain(fast)) == live.QUEUE_SIZE
+
+        for i in range(10):  # `slow` está llena: desborda una vez y después se ignora
+            broker.publish("c", {"type": "slots", "n": live.QUEUE_SIZE + i})
+        assert slow.overflowed
+        assert drain(slow) == [live.RESYNC]
+        assert len(drain(fast)) == 10  # el otro suscriptor no se entera
+
+        # la ruta SSE baja `overflowed` cuando entrega el resync
+        slow.overflowed = False
+        broker.publish("c", {"type": "slots", "n": -1})
+        assert drain(slow) == [{"type": "slots", "n": -1}]
+
+    asyncio.run(main())
+
+
+def test_publish_from_a_threadpool_thread():
+    async def main():
+        broker = live.Broker()
+        sub = broker.subscribe("c")
+        other = broker.subscribe("otro")
+
+        # como una ruta sync: publish corre en otro hilo, con el loop ocupado
+        th = threading.Thread(target=broker.publish, args=("c", {"type": "slots", "from": "thread"}))
+        th.start()
+        th.join()
+        assert sub.queue.empty()  # todavía no: lo encola el loop (call_soon_threadsafe)
+        event = await asyncio.wait_for(sub.queue.get(), 1)
+        assert event == {"type": "slots", "from": "thread"}
+        assert other.queue.empty()
+
+        broker.unsubscribe(sub)
+        broker.unsubscribe(other)
+        assert not broker._channels
+        await asyncio.to_thread(broker.publish, "c", {"type": "slots"})  # sin suscriptores: nada
+        await asyncio.sleep(0)
+        assert sub.queue.empty()
+
+    asyncio.run(main())
+
+
+def test_publish_before_any_loop_is_a_no_op():
+    live.Broker().publish("c", {"type": "slots"})
+
+
+# ---------------- /turnos/slots ----------------
+@pytest.fixture(scope="module")
+def client():
+    with SessionLocal() as db:
+        staff, cl = Staff(name="Live staff"), Client(name="Live cliente", phone="")
+        db.add_all([staff, cl])
+        db.flush()
+        db.add(Appointment(date=DAY, start_time=app.time(10, 0), duration_min=60, client_id=cl.id,
+                           staff_id=staff.id, salon=1, status="ACTIVO"))
+        db.commit()
+        staff_id = staff.id
+    with TestClient(app.app) as c:
+        c.staff_id = staff_id
+        yield c
+
+
+def slots(client, **params) -> str:
+    r = client.get("/turnos/slots", params={
+        "date_str": DAY.isoformat(), "staff_id": client.staff_id, "salon": 1, **params,
+    })
+    assert r.status_code == 200, r.text
+    return r.text
+
+
+def test_slots_partial_renders_only_the_range(client):
+    html = slots(client, desde="09:30", hasta="11:30")
+    assert re.findall(r'data-slot="([\d:]+)"', html) == ["09:30", "10:00", "10:30", "11:00"]
+    assert "10:00 · Live cliente" in html
+    assert "Ocupado por turno de 10:00 a 11:00" in html  # 10:30
+    assert html.count("LIBRE") == 2  # 09:30 y 11:00
+    assert "<html" not in html.lower()
+
+
+def test_slots_partial_matches_the_day_view(client):
+    full = client.get(f"/turnos?date_str={DAY.isoformat()}&staff_id={client.staff_id}&salon=1").text
+    part = slots(client, desde="10:00", hasta="10:30")
+    assert part.strip() in full
+
+
+def test_slots_partial_rejects_bad_dates(client):
+    assert client.get("/turnos/slots", params={"date_str": "09/08/2038"}).status_code == 400
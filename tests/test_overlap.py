@@ -0,0 +1,108 @@
+"""Chequeo de solapamientos: DayIntervals y la edición de turnos."""
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+from app import DayIntervals
+from db import SessionLocal
+from models import Appointment, Client, Staff
+
+DAY = date(2034, 2, 7)
+
+
+# ---------------- DayIntervals ----------------
+def test_back_to_back_intervals_do_not_collide():
+    idx = DayIntervals([(600, 660, 1)])  # 10:00-11:00
+    assert not idx.collides(660, 690)  # empieza justo cuando termina
+    assert not idx.collides(540, 600)  # termina justo cuando empieza
+    assert idx.collides(659, 700)
+    assert idx.collides(540, 601)
+
+
+def test_collides_sees_an_overlap_already_in_the_db():
+    # 10:00-13:00 y 10:30-11:00 (solapados de antes): 12:00 choca con el primero
+    idx = DayIntervals([(630, 660, 2), (600, 780, 1)])
+    assert idx.starts == [600, 630]
+    assert idx.max_end == [780, 780]
+    assert idx.collides(720, 750)
+    assert not idx.collides(780, 810)
+
+
+def test_zero_length_item_blocks_nothing_at_its_edges():
+    idx = DayIntervals([(600, 600, 1)])
+    assert not idx.collides(600, 630)
+    assert not idx.collides(570, 600)
+    assert idx.collides(570, 630)  # lo contiene estrictamente
+    assert not DayIntervals().collides(600, 630)
+
+
+def test_add_keeps_running_max_end():
+    idx = DayIntervals([(600, 660, 1), (720, 750, 2)])
+    idx.add(540, 800, 3)  # empieza antes que todos y termina después
+    assert idx.starts == [540, 600, 720]
+    assert idx.max_end == [800, 800, 800]
+    assert idx.collides(760, 790)
+
+    idx.add(900, 900, 4)  # largo cero al final
+    assert idx.starts[-1] == 900 and idx.max_end[-1] == 900
+    assert not idx.collides(900, 930)
+    assert idx.collides(890, 910)
+
+
+@pytest.mark.parametrize("items", [[], [(600, 660, 1)], [(600, 660, 1), (600, 630, 2), (700, 800, 3)]])
+def test_add_matches_building_from_scratch(items):
+    idx = DayIntervals(items)
+    for item in [(630, 700, 9), (500, 520, 10), (800, 800, 11)]:
+        idx.add(*item)
+        items = items + [item]
+        fresh = DayIntervals(items)
+        assert (idx.items, idx.starts, idx.max_end) == (fresh.items, fresh.starts, fresh.max_end)
+
+
+# ---------------- edición (turnos_editar_post) ----------------
+@pytest.fixture(scope="module")
+def client():
+    with SessionLocal() as db:
+        staff, cl = Staff(name="Overlap staff"), Client(name="Overlap cliente", phone="")
+        db.add_all([staff, cl])
+        db.flush()
+        a = Appointment(date=DAY, start_time=app.time(10, 0), duration_min=60,
+                        client_id=cl.id, staff_id=staff.id, salon=1, status="ACTIVO")
+        b = Appointment(date=DAY, start_time=app.time(12, 0), duration_min=60,
+                        client_id=cl.id, staff_id=staff.id, salon=1, status="ACTIVO")
+        db.add_all([a, b])
+        db.commit()
+        ids = (staff.id, cl.id, a.id, b.id)
+    with TestClient(app.app) as c:
+        c.staff_id, c.client_id, c.first_id, c.second_id = ids
+        yield c
+
+
+def edit(client, appt_id: int, time_str: str, duration_min: int = 60):
+    return client.post(f"/turnos/{appt_id}/editar", data={
+        "date_str": DAY.isoformat(), "time_str": time_str, "client_id": client.client_id,
+        "duration_min": duration_min, "staff_id": client.staff_id, "salon_id": 1,
+    }, follow_redirects=False)
+
+
+def start_of(appt_id: int):
+    with SessionLocal() as db:
+        return db.get(Appointment, appt_id).start_time.strftime("%H:%M")
+
+
+def test_edit_onto_an_occupied_slot_is_rejected(client):
+    r = edit(client, client.second_id, "10:30")
+    assert r.status_code == 400
+    assert "superpone" in r.json()["detail"]
+    assert start_of(client.second_id) == "12:00"
+
+
+def test_edit_in_place_does_not_collide_with_itself(client):
+    # misma hora, más largo: solo se superpondría consigo mismo
+    assert edit(client, client.first_id, "10:00", duration_min=90).status_code == 303
+    assert edit(client, client.first_id, "10:30").status_code == 303
+    assert start_of(client.first_id) == "10:30"
+    # 11:30 ya choca con el de las 12:00
+    assert edit(client, client.first_id, "11:30").status_code == 400
@@ -0,0 +1,75 @@
+"""
+/turnos y /turnos/{id}/wa_link corren una cantidad fija de sentencias SQL,
+sin importar cuántos turnos tenga el día (sin lazy loads por turno).
+"""
+from datetime import date, time
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+import app
+from db import SessionLocal, count_queries
+from models import Appointment, Client, Specialty, Staff
+
+EMPTY_DAY = date(2031, 3, 3)
+BUSY_DAY = date(2031, 3, 4)
+BUSY_COUNT = 12
+
+
+@pytest.fixture(scope="module")
+def client():
+    with SessionLocal() as db:
+        staff = Staff(name="Qc staff")
+        specialties = [Specialty(name=f"Qc servicio {i}", color_hex="#60a5fa") for i in range(3)]
+        clients = [Client(name=f"Qc cliente {i}", phone=f"11 5555-{i:04d}") for i in range(BUSY_COUNT)]
+        db.add_all([staff, *specialties, *clients])
+        db.flush()
+        db.execute(insert(Appointment), [
+            {
+                "date": BUSY_DAY,
+                "start_time": time(8 + i // 2, 30 * (i % 2)),
+                "duration_min": 30,
+                "client_id": c.id,
+                "specialty_id": specialties[i % 3].id,
+                "staff_id": staff.id,
+                "salon": 1,
+                "status": "ACTIVO",
+            }
+            for i, c in enumerate(clients)
+        ])
+        db.commit()
+        staff_id = staff.id
+
+    with TestClient(app.app) as c:
+        c.staff_id = staff_id
+        yield c
+
+
+def count_get(client, url: str):
+    with count_queries() as qc:
+        r = client.get(url)
+    assert r.status_code == 200, r.text
+    return qc, r
+
+
+def test_day_view_query_count_does_not_grow_with_bookings(client):
+    # primera visita: carga staff / especialidades cacheados (refdata)
+    client.get("/turnos?date_str=2031-03-01")
+
+    empty, _ = count_get(client, f"/turnos?date_str={EMPTY_DAY}&staff_id={client.staff_id}")
+    busy, r = count_get(client, f"/turnos?date_str={BUSY_DAY}&staff_id={client.staff_id}")
+
+    assert r.text.count("Qc cliente") == BUSY_COUNT
+    assert busy.count == empty.count, busy.statements
+    # versión de refdata + versiones del día + turnos (con cliente y servicio en el mismo SELECT)
+    assert busy.count == 3, busy.statements
+
+
+def test_wa_link_is_a_single_query(client):
+    with SessionLocal() as db:
+        appt_id = db.query(Appointment.id).filter(Appointment.date == BUSY_DAY).first()[0]
+
+    qc, r = count_get(client, f"/turnos/{appt_id}/wa_link")
+    assert r.json()["url"].startswith("https://wa.me/")
+    assert qc.count == 1, qc.statements
@@ -0,0 +1,143 @@
+"""
+Las consultas calientes de app.py tienen que ir por los índices compuestos
+de `appointments` (y no recorrer la tabla): se capturan las sentencias que
+emite cada helper y se corre EXPLAIN QUERY PLAN sobre cada una.
+"""
+import re
+from contextlib import contextmanager
+from datetime import date, time, timedelta
+
+import pytest
+from sqlalchemy import event, insert
+
+import app
+from models import Appointment, Client, Staff
+
+DAY = date.today() + timedelta(days=3)
+
+
+@contextmanager
+def captured(engine):
+    stmts = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        stmts.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        yield stmts
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
+
+
+def query_plans(engine, stmts, table="appointments") -> list[str]:
+    """Un texto por sentencia que toca `table`, con todas las filas del plan."""
+    plans = []
+    with engine.connect() as conn:
+        for statement, params in stmts:
+            if not re.search(rf"\bFROM {table}\b", statement):
+                continue
+            rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, params).all()
+            plans.append("\n".join(r[-1] for r in rows))
+    assert plans, f"ninguna sentencia sobre {table}"
+    return plans
+
+
+def assert_uses(plans: list[str], index: str, table="appointments"):
+    for plan in plans:
+        assert index in plan, plan
+        assert not re.search(rf"^SCAN {table}\b", plan, re.M), plan
+
+
+@pytest.fixture
+def seeded(session):
+    session.add_all([Staff(id=1, name="Ana"), Staff(id=2, name="Bea")])
+    session.add_all([Client(id=i, name=f"Cliente {i}", phone="") for i in range(1, 21)])
+    session.flush()
+    session.execute(insert(Appointment), [
+        {
+            "date": date.today() + timedelta(days=d),
+            "start_time": time(8 + h, 0),
+            "duration_min": 60,
+            "client_id": 1 + (d * 7 + h) % 20,
+            "staff_id": 1 + h % 2,
+            "salon": 1,
+            "status": "CANCELADO" if h == 5 else "ACTIVO",
+        }
+        for d in range(-60, 30) for h in range(8)
+    ])
+    session.commit()
+    return session
+
+
+def test_day_view_uses_day_index(seeded, sqlite_file):
+    with captured(sqlite_file) as stmts:
+        seeded.execute(app.day_view_query(DAY, 1, 1)).scalars().all()
+    assert_uses(query_plans(sqlite_file, stmts), "ix_appointments_day")
+
+
+@pytest.mark.parametrize("staff_id", [1, None])
+def test_overlap_check_uses_day_index(seeded, sqlite_file, staff_id):
+    with captured(sqlite_file) as stmts:
+        app.assert_no_overlap(seeded, DAY, time(18, 30), 30, staff_id, 1)
+    plans = query_plans(sqlite_file, stmts)
+    assert_uses(plans, "ix_appointments_day")
+    # start_time / duración salen del índice, sin ir a la tabla
+    assert all("COVERING INDEX" in p for p in plans), plans
+
+
+def test_nearest_open_date_uses_day_index(seeded, sqlite_file):
+    app._next_open["today"] = None  # cache de otro test (otra base)
+    with captured(sqlite_file) as stmts:
+        assert app.nearest_open_date(seeded) == date.today()
+    assert_uses(query_plans(sqlite_file, stmts), "ix_appointments_day")
+
+
+def test_client_history_uses_client_indexes(seeded, sqlite_file):
+    with captured(sqlite_file) as stmts:
+        history = app.client_history(seeded, 3)
+    assert history and history == sorted(history, key=lambda a: (a.date, a.start_time), reverse=True)
+
+    assert_uses(query_plans(sqlite_file, stmts), "ix_appointments_client")
+    assert_uses(
+        query_plans(sqlite_file, stmts, "appointments_archive"),
+        "ix_appointments_archive_client", "appointments_archive",
+    )
+    # el orden sale del índice: sin B-tree temporal
+    assert not any("TEMP B-TREE" in p for p in query_plans(sqlite_file, stmts)), stmts
+
+
+def test_inactive_clients_is_a_covering_index_scan():
+    from fastapi.testclient import TestClient
+    from db import engine
+
+    client = TestClient(app.app)
+    with captured(engine) as stmts:
+        assert client.get("/clientes/inactivos?dias=30").status_code == 200
+        assert client.get("/clientes?orden=reciente").status_code == 200
+
+    plans = query_plans(engine, [(s, p) for s, p in stmts if "last_visit DESC" in s], "clients")
+    assert len(plans) == 2
+    for plan in plans:
+        assert "COVERING INDEX ix_clients_recent" in plan, plan
+        assert "TEMP B-TREE" not in plan, plan
+
+
+def test_export_streams_each_table_in_index_order():
+    from fastapi.testclient import TestClient
+    from db import engine
+
+    client = TestClient(app.app)
+    with captured(engine) as stmts:
+        assert client.get("/exportar/turnos?formato=csv").status_code == 200
+
+    ordered = [(s, p) for s, p in stmts if "ORDER BY" in s]
+    live = query_plans(engine, ordered, "appointments")
+    archived = query_plans(engine, ordered, "appointments_archive")
+    assert len(live) == len(archived) == 1
+    assert "ix_appointments_day" in live[0], live
+    assert "ix_appointments_archive_day" in archived[0], archived
+    # a lo sumo ordena los turnos de un mismo día (start_time), nunca todo el rango
+    for plan in live + archived:
+        for line in plan.splitlines():
+            assert "TEMP B-TREE" not in line or "RIGHT PART OF ORDER BY" in line, plan
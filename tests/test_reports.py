@@ -0,0 +1,100 @@
+"""daily_rollups mantenido por la app == reports.rebuild_rollups desde los turnos."""
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+import app
+import reports
+from db import SessionLocal, engine
+from models import Appointment, Client, DailyRollup, Specialty, Staff
+
+FIRST = date(2036, 3, 3)
+LAST = FIRST + timedelta(days=60)
+
+
+@pytest.fixture(scope="module")
+def client():
+    with SessionLocal() as db:
+        staff = [Staff(name="Rollup staff 1"), Staff(name="Rollup staff 2")]
+        specialty = Specialty(name="Rollup servicio", color_hex="#60a5fa")
+        people = [Client(name="Rollup A", phone=""), Client(name="Rollup B", phone="")]
+        db.add_all([*staff, specialty, *people])
+        db.commit()
+        ids = ([s.id for s in staff], specialty.id, [c.id for c in people])
+    with TestClient(app.app) as c:
+        c.staff_ids, c.specialty_id, c.client_ids = ids
+        yield c
+
+
+def rollups(conn) -> dict:
+    rows = conn.execute(
+        select(DailyRollup).where(DailyRollup.date >= FIRST, DailyRollup.date <= LAST)
+    ).mappings()
+    # la app deja en cero las filas que se vaciaron; el rebuild no las crea
+    return {
+        tuple(r[k] for k in reports.KEY): tuple(r[k] for k in reports.TOTALS)
+        for r in rows if any(r[k] for k in reports.TOTALS)
+    }
+
+
+def assert_matches_rebuild():
+    with engine.connect() as conn:
+        incremental = rollups(conn)
+        reports.rebuild_rollups(conn)
+        rebuilt = rollups(conn)
+        conn.rollback()  # la base queda como la dejó la app
+    assert incremental == rebuilt
+    return incremental
+
+
+def day_appts(d: date) -> list[int]:
+    with SessionLocal() as db:
+        return [r.id for r in db.query(Appointment.id).filter(Appointment.date == d).order_by(Appointment.start_time)]
+
+
+def test_incremental_rollups_match_a_rebuild(client):
+    st1, st2 = client.staff_ids
+    a, b = client.client_ids
+    form = {"client_id": a, "staff_id": st1, "specialty_id": client.specialty_id, "duration_min": 60}
+
+    # alta simple con seña, recurrente y lote por API
+    for data in (
+        {"date_str": FIRST.isoformat(), "time_str": "10:00", "deposit_paid": "1", "deposit_amount": 5000},
+        {"date_str": FIRST.isoformat(), "time_str": "12:00", "repeat_weeks": 1, "repeat_count": 4,
+         "deposit_paid": "1", "deposit_amount": 8000},
+    ):
+        assert client.post("/turnos/nuevo", data={**form, **data}, follow_redirects=False).status_code == 303
+    r = client.post("/api/turnos/lote", json={
+        "client_id": b, "staff_id": st2, "specialty_id": client.specialty_id, "duration_min": 90,
+        "occurrences": [{"date": (FIRST + timedelta(days=d)).isoformat(), "time": "11:00"} for d in (0, 1, 8)]
+                       + [{"date": FIRST.isoformat(), "time": "16:00", "duration_min": 30, "staff_id": st1}],
+    })
+    assert all(x["ok"] for x in r.json()["results"]), r.text
+    totals = assert_matches_rebuild()
+    assert sum(t[1] for t in totals.values()) == 1 + 4 + 4
+
+    # edición: cambia staff, especialidad, duración, seña y fecha
+    first, *_ = day_appts(FIRST)
+    r = client.post(f"/turnos/{first}/editar", data={
+        "date_str": (FIRST + timedelta(days=2)).isoformat(), "time_str": "09:00", "client_id": a,
+        "specialty_id": 0, "duration_min": 45, "staff_id": st2, "salon_id": 2, "deposit_paid": "0",
+    }, follow_redirects=False)
+    assert r.status_code == 303, r.text
+    assert_matches_rebuild()
+
+    # cancelación (y cancelar dos veces no cuenta doble)
+    for appt_id in day_appts(FIRST + timedelta(days=7))[:1] * 2 + day_appts(FIRST + timedelta(days=1)):
+        assert client.post(f"/turnos/{appt_id}/cancelar", follow_redirects=False).status_code == 303
+    totals = assert_matches_rebuild()
+    assert sum(t[2] for t in totals.values()) == 2
+
+    # editar un cancelado no lo vuelve a contar como reservado
+    cancelled = day_appts(FIRST + timedelta(days=1))[0]
+    r = client.post(f"/turnos/{cancelled}/editar", data={
+        "date_str": (FIRST + timedelta(days=3)).isoformat(), "time_str": "11:00", "client_id": b,
+        "duration_min": 120, "staff_id": st2, "salon_id": 1,
+    }, follow_redirects=False)
+    assert r.status_code == 303, r.text
+    assert_matches_rebuild()
@@ -0,0 +1,106 @@
+"""Búsqueda de clientes (search_clients / /api/clientes/buscar): FTS5 trigram y LIKE."""
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+import migrations
+from models import Client
+from test_query_plans import captured
+
+NAMES = [
+    ("Ana Pérez", "11 5555-1234"),
+    ("Anabel Gómez", "(011) 4444-9876"),
+    ("Bea 50% off", "221 333-0000"),
+    ('Carla "La Rubia" Díaz', "15 6000-1111"),
+    ("Dana", ""),
+]
+
+
+@pytest.fixture
+def clients(session):
+    session.add_all([Client(name=n, phone=p) for n, p in NAMES])
+    session.commit()
+    assert migrations.CLIENT_FTS, "SQLite sin FTS5 trigram"
+    return session
+
+
+def names(rows):
+    return [r.name for r in rows]
+
+
+def uses_fts(stmts):
+    return any("clients_fts" in s for s, _ in stmts)
+
+
+@pytest.mark.parametrize("q, expected", [
+    ("ana", ["Ana Pérez", "Anabel Gómez", "Dana"]),
+    ("ANA P", ["Ana Pérez"]),
+    ("0% o", ["Bea 50% off"]),
+    ('"La Rubia"', ['Carla "La Rubia" Díaz']),
+    ('a "l', ['Carla "La Rubia" Díaz']),
+])
+def test_fts_matches_like_fallback(clients, sqlite_file, monkeypatch, q, expected):
+    with captured(sqlite_file) as stmts:
+        rows, _ = app.search_clients(clients, q, 10)
+    assert uses_fts(stmts)
+    assert names(rows) == expected
+
+    monkeypatch.setattr(migrations, "CLIENT_FTS", False)
+    with captured(sqlite_file) as stmts:
+        rows, _ = app.search_clients(clients, q, 10)
+    assert not uses_fts(stmts)
+    assert names(rows) == expected
+
+
+@pytest.mark.parametrize("q, expected", [
+    ("an", ["Ana Pérez", "Anabel Gómez", "Dana"]),
+    ("%", ["Bea 50% off"]),
+    ('"', ['Carla "La Rubia" Díaz']),
+    ("_", []),
+])
+def test_short_terms_use_like(clients, sqlite_file, q, expected):
+    with captured(sqlite_file) as stmts:
+        rows, _ = app.search_clients(clients, q, 10)
+    assert not uses_fts(stmts)
+    assert names(rows) == expected
+
+
+@pytest.mark.parametrize("q, expected", [
+    ("5555-1234", ["Ana Pérez"]),
+    ("(11) 5555 12", ["Ana Pérez"]),
+    ("+54 9 11 5555", ["Ana Pérez"]),
+    ("4444.98", ["Anabel Gómez"]),
+    ("55", ["Ana Pérez"]),  # corto: LIKE sobre phone_digits
+    ("0000", ["Bea 50% off"]),
+])
+def test_phone_digits_match_formatted_input(clients, monkeypatch, q, expected):
+    assert names(app.search_clients(clients, q, 10)[0]) == expected
+    monkeypatch.setattr(migrations, "CLIENT_FTS", False)
+    assert names(app.search_clients(clients, q, 10)[0]) == expected
+
+
+def test_blank_query_lists_everyone_by_name(clients):
+    rows, has_more = app.search_clients(clients, "  ", 10)
+    assert names(rows) == sorted(n for n, _ in NAMES)
+    assert not has_more
+
+
+def test_api_pages_with_next_offset():
+    with app.SessionLocal() as db:
+        db.add_all([Client(name=f"Paginado {i:02d}", phone="") for i in range(7)])
+        db.commit()
+
+    client = TestClient(app.app)
+    seen, offset = [], 0
+    while offset is not None:
+        r = client.get("/api/clientes/buscar", params={"q": "paginado", "limit": 3, "offset": offset})
+        body = r.json()
+        assert len(body["items"]) <= 3
+        seen += [it["name"] for it in body["items"]]
+        offset = body["next_offset"]
+    assert seen == [f"Paginado {i:02d}" for i in range(7)]
+
+    last = client.get("/api/clientes/buscar", params={"q": "paginado", "limit": 3, "offset": 6}).json()
+    assert len(last["items"]) == 1 and last["next_offset"] is None
+    exact = client.get("/api/clientes/buscar", params={"q": "paginado", "limit": 7}).json()
+    assert len(exact["items"]) == 7 and exact["next_offset"] is None
@@ -0,0 +1,101 @@
+"""/api/sync: foto completa (reset) y después solo lo que cambió desde `since`."""
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+import app
+import archive
+from db import SessionLocal, engine
+from models import Appointment, ChangeLog, Client, Staff
+
+DAY = date(2039, 1, 10)
+
+
+@pytest.fixture(scope="module")
+def client():
+    with SessionLocal() as db:
+        staff, cl = Staff(name="Sync staff"), Client(name="Sync cliente", phone="11 5555-7777")
+        db.add_all([staff, cl])
+        db.commit()
+        ids = (staff.id, cl.id)
+    with TestClient(app.app) as c:
+        c.staff_id, c.client_id = ids
+        yield c
+
+
+def book(client, time_str: str) -> int:
+    r = client.post("/turnos/nuevo", data={
+        "date_str": DAY.isoformat(), "time_str": time_str, "client_id": client.client_id,
+        "staff_id": client.staff_id, "duration_min": 30,
+    }, follow_redirects=False)
+    assert r.status_code == 303, r.text
+    with SessionLocal() as db:
+        return db.query(Appointment.id).filter(
+            Appointment.date == DAY, Appointment.start_time == app.time(*map(int, time_str.split(":"))),
+        ).scalar()
+
+
+def sync(client, since: int | None = None) -> dict:
+    r = client.get("/api/sync", params={} if since is None else {"since": since})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def by_id(body: dict) -> dict:
+    return {a["id"]: a for a in body["appointments"]}
+
+
+def test_snapshot_then_deltas(client):
+    first, second = book(client, "09:00"), book(client, "10:00")
+
+    snapshot = sync(client)
+    assert snapshot["reset"] is True
+    assert {first, second} <= set(by_id(snapshot))
+    assert by_id(snapshot)[first]["start_time"] == "09:00:00"
+    assert {"id": client.client_id, "name": "Sync cliente", "phone": "11 5555-7777"} in snapshot["clients"]
+    cursor = snapshot["change_id"]
+
+    nothing = sync(client, cursor)
+    assert (nothing["reset"], nothing["appointments"], nothing["deleted_appointments"]) == (False, [], [])
+    assert nothing["change_id"] == cursor
+
+    # alta, edición y cancelación
+    third = book(client, "12:00")
+    r = client.post(f"/turnos/{first}/editar", data={
+        "date_str": DAY.isoformat(), "time_str": "09:30", "client_id": client.client_id,
+        "duration_min": 30, "staff_id": client.staff_id, "salon_id": 1,
+    }, follow_redirects=False)
+    assert r.status_code == 303, r.text
+    assert client.post(f"/turnos/{second}/cancelar", follow_redirects=False).status_code == 303
+
+    delta = sync(client, cursor)
+    assert delta["reset"] is False and delta["has_more"] is False
+    assert set(by_id(delta)) == {first, third}
+    assert by_id(delta)[first]["start_time"] == "09:30:00"
+    assert delta["deleted_appointments"] == [second]
+    assert [c["id"] for c in delta["clients"]] == [client.client_id]
+    assert delta["change_id"] > cursor
+    cursor = delta["change_id"]
+
+    # archivar (el cancelado se mueve) vuelve como borrado
+    assert archive.archive_appointments(engine).moved >= 1
+    delta = sync(client, cursor)
+    assert delta["reset"] is False
+    assert second in delta["deleted_appointments"]
+    assert not {first, third} & set(by_id(delta))
+    cursor = delta["change_id"]
+
+    # si el change_log ya se podó más allá del cursor: foto completa de nuevo
+    with engine.begin() as conn:
+        conn.execute(update(ChangeLog).values(changed_at=app.datetime(2000, 1, 1)))
+    assert archive.archive_appointments(engine).pruned_changes >= 1
+    with SessionLocal() as db:
+        assert app.get_version(db, "change_log_pruned") >= cursor
+
+    again = sync(client, cursor - 1)
+    assert again["reset"] is True
+    assert {first, third} <= set(by_id(again))
+    assert second not in by_id(again)
+    assert sync(client, again["change_id"])["reset"] is False
@@ -0,0 +1,124 @@
+"""
+clients.last_visit / visit_count se mantienen al guardar turnos: después de
+cada alta / edición / cancelación / archivado tienen que coincidir con
+recalcularlos desde los turnos (activos + archivados).
+"""
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select, union_all
+
+import app
+import archive
+from db import SessionLocal, engine
+from models import Appointment, AppointmentArchive, Client, Staff
+
+OLD = date(2021, 3, 1)  # se archiva (más de ARCHIVE_AFTER_DAYS)
+SOON = date(2035, 4, 2)
+
+
+@pytest.fixture(scope="module")
+def client():
+    with SessionLocal() as db:
+        staff = Staff(name="Visitas staff")
+        people = [Client(name=f"Visitas {n}", phone="") for n in "ABC"]
+        db.add_all([staff, *people])
+        db.commit()
+        ids = (staff.id, [c.id for c in people])
+    with TestClient(app.app) as c:
+        c.staff_id, c.client_ids = ids
+        yield c
+
+
+def stored(ids):
+    with SessionLocal() as db:
+        return {
+            r.id: (r.last_visit, r.visit_count or 0)
+            for r in db.query(Client.id, Client.last_visit, Client.visit_count).filter(Client.id.in_(ids))
+        }
+
+
+def recomputed(ids):
+    visits = union_all(*(
+        select(model.client_id, model.date).where(model.status != "CANCELADO", model.client_id.in_(ids))
+        for model in (Appointment, AppointmentArchive)
+    )).subquery()
+    with SessionLocal() as db:
+        found = {
+            cid: (last, n)
+            for cid, last, n in db.execute(
+                select(visits.c.client_id, func.max(visits.c.date), func.count()).group_by(visits.c.client_id)
+            )
+        }
+    return {cid: found.get(cid, (None, 0)) for cid in ids}
+
+
+def check(client):
+    assert stored(client.client_ids) == recomputed(client.client_ids)
+
+
+def appt_ids(client_id: int) -> list[int]:
+    with SessionLocal() as db:
+        return [r.id for r in db.query(Appointment.id).filter(
+            Appointment.client_id == client_id, Appointment.status != "CANCELADO",
+        ).order_by(Appointment.date)]
+
+
+def create(client, d: date, client_id: int, **extra):
+    r = client.post("/turnos/nuevo", data={
+        "date_str": d.isoformat(), "time_str": "10:00", "client_id": client_id,
+        "staff_id": client.staff_id, "duration_min": 60, **extra,
+    }, follow_redirects=False)
+    assert r.status_code == 303, r.text
+
+
+def edit(client, appt_id: int, d: date, client_id: int):
+    r = client.post(f"/turnos/{appt_id}/editar", data={
+        "date_str": d.isoformat(), "time_str": "15:00", "client_id": client_id,
+        "duration_min": 60, "staff_id": client.staff_id, "salon_id": 1,
+    }, follow_redirects=False)
+    assert r.status_code == 303, r.text
+
+
+def cancel(client, appt_id: int):
+    assert client.post(f"/turnos/{appt_id}/cancelar", follow_redirects=False).status_code == 303
+
+
+def test_visits_follow_every_write(client):
+    a, b, c = client.client_ids
+
+    create(client, OLD, a)
+    create(client, OLD + timedelta(days=1), c)
+    check(client)
+
+    # recurrente: 3 semanas seguidas
+    create(client, SOON, a, repeat_weeks=1, repeat_count=3)
+    # lote por API, dos fechas para b
+    r = client.post("/api/turnos/lote", json={
+        "client_id": b, "staff_id": client.staff_id, "duration_min": 60,
+        "occurrences": [{"date": (SOON + timedelta(days=1)).isoformat(), "time": "09:00"},
+                        {"date": (SOON + timedelta(days=30)).isoformat(), "time": "09:00"}],
+    })
+    assert all(x["ok"] for x in r.json()["results"]), r.text
+    check(client)
+
+    old_a, first_a, second_a, last_a = appt_ids(a)
+    edit(client, last_a, SOON + timedelta(days=60), b)  # cambia cliente y fecha (era la última de a)
+    edit(client, second_a, SOON - timedelta(days=3), a)  # solo fecha, mismo cliente
+    check(client)
+
+    cancel(client, appt_ids(b)[-1])  # la última visita de b
+    cancel(client, appt_ids(c)[0])  # c se queda sin visitas
+    check(client)
+
+    moved = archive.archive_appointments(engine).moved
+    assert moved >= 3  # el viejo de a y los dos cancelados
+    check(client)
+
+    # con visitas en el archivo: cancelar la más nueva busca la anterior en ambas tablas
+    create(client, OLD + timedelta(days=2), c)
+    cancel(client, first_a)
+    cancel(client, appt_ids(a)[-1])
+    check(client)
+    assert stored([a])[a] == (OLD, 1)